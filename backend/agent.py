@@ -5,9 +5,14 @@ Description: Handles AI interactions using OpenRouter free models
 """
 
 import os
+import json
 import uuid
+import random
+import asyncio
+import hashlib
 from typing import Dict, List, Optional
-from datetime import datetime
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 
 import httpx
 from dotenv import load_dotenv
@@ -15,18 +20,33 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+# Upstream statuses worth retrying (rate limiting and transient server errors)
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
 class AIAgent:
     """AI Agent using OpenRouter free models"""
     
-    def __init__(self, vector_store):
+    def __init__(self, vector_store, transport: Optional[httpx.AsyncBaseTransport] = None):
         self.vector_store = vector_store
         self.api_key = os.getenv("OPENROUTER_API_KEY")
         self.model = os.getenv("MODEL_NAME", "meta-llama/llama-3.1-8b-instruct:free")
         self.base_url = "https://openrouter.ai/api/v1/chat/completions"
         
+        # Retry settings for transient OpenRouter failures
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", 3))
+        self.retry_base_delay = float(os.getenv("LLM_RETRY_BASE_DELAY", 0.5))
+        self.retry_max_delay = float(os.getenv("LLM_RETRY_MAX_DELAY", 8.0))
+        
+        # Optional HTTP transport (used to point the agent at a mock upstream)
+        self._transport = transport
+        
         # Store conversation history
         self.conversations: Dict[str, List[Dict]] = {}
         
+        # In-flight upstream calls keyed by request hash, shared by identical requests
+        self._inflight: Dict[str, asyncio.Task] = {}
+        
         if not self.api_key:
             raise ValueError("OPENROUTER_API_KEY not found in environment variables")
         
@@ -53,7 +73,8 @@ Remember: You're designed to make document analysis easy and conversational."""
     async def generate_response(
         self,
         message: str,
-        conversation_id: Optional[str] = None
+        conversation_id: Optional[str] = None,
+        document_ids: Optional[List[str]] = None
     ) -> Dict:
         """
         Generate AI response using OpenRouter
@@ -61,6 +82,7 @@ Remember: You're designed to make document analysis easy and conversational."""
         Args:
             message: User's message
             conversation_id: Optional conversation ID for context
+            document_ids: Optional document IDs to restrict retrieval to
             
         Returns:
             Dict with response and conversation_id
@@ -77,7 +99,7 @@ Remember: You're designed to make document analysis easy and conversational."""
         context = ""
         if self.vector_store.is_initialized():
             try:
-                relevant_docs = self.vector_store.search(message, k=3)
+                relevant_docs = self.vector_store.search(message, k=3, document_ids=document_ids)
                 if relevant_docs:
                     context = "\n\n".join([
                         f"Document excerpt:\n{doc}" for doc in relevant_docs
@@ -109,47 +131,23 @@ Please provide a clear, accurate answer based on the document content. If the an
         
         # Call OpenRouter API
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
-                    self.base_url,
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json",
-                        "HTTP-Referer": "https://github.com/umair-elahi/ai-voice-assistant",
-                        "X-Title": "AI Voice Assistant"
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": messages,
-                        "temperature": 0.7,
-                        "max_tokens": 1000,
-                        "top_p": 0.9,
-                        "frequency_penalty": 0.0,
-                        "presence_penalty": 0.0
-                    }
-                )
-                
-                response.raise_for_status()
-                result = response.json()
-                
-                # Extract AI response
-                ai_response = result["choices"][0]["message"]["content"]
-                
-                # Update conversation history
-                self.conversations[conversation_id].append({
-                    "role": "user",
-                    "content": message
-                })
-                self.conversations[conversation_id].append({
-                    "role": "assistant",
-                    "content": ai_response
-                })
-                
-                return {
-                    "response": ai_response,
-                    "conversation_id": conversation_id,
-                    "model": self.model
-                }
+            ai_response = await self._complete(messages)
+            
+            # Update conversation history
+            self.conversations[conversation_id].append({
+                "role": "user",
+                "content": message
+            })
+            self.conversations[conversation_id].append({
+                "role": "assistant",
+                "content": ai_response
+            })
+            
+            return {
+                "response": ai_response,
+                "conversation_id": conversation_id,
+                "model": self.model
+            }
         
         except httpx.HTTPStatusError as e:
             error_detail = e.response.text
@@ -170,6 +168,146 @@ Please provide a clear, accurate answer based on the document content. If the an
                 "error": str(e)
             }
     
+    async def _complete(self, messages: List[Dict]) -> str:
+        """
+        Get a completion, coalescing identical in-flight requests
+        
+        Concurrent callers sending the same model and messages share a single
+        upstream call instead of each hitting OpenRouter.
+        
+        Args:
+            messages: Chat messages to send
+            
+        Returns:
+            Assistant message content
+        """
+        key = self._request_key(messages)
+        task = self._inflight.get(key)
+        
+        if task is None:
+            task = asyncio.ensure_future(self._post_with_retry(messages))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._release_inflight(key, t))
+        
+        # Shield so one caller disconnecting does not cancel the shared call
+        return await asyncio.shield(task)
+    
+    def _release_inflight(self, key: str, task: asyncio.Task):
+        """Drop a finished upstream call from the in-flight table"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+    
+    def _request_key(self, messages: List[Dict]) -> str:
+        """Hash the model and prompt to identify identical requests"""
+        payload = json.dumps({"model": self.model, "messages": messages}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    async def _post_with_retry(self, messages: List[Dict]) -> str:
+        """
+        Call OpenRouter with bounded retries on transient failures
+        
+        Retries use exponential backoff with full jitter and honour the
+        upstream Retry-After header when one is sent.
+        
+        Args:
+            messages: Chat messages to send
+            
+        Returns:
+            Assistant message content
+        """
+        async with httpx.AsyncClient(timeout=60.0, transport=self._transport) as client:
+            attempt = 0
+            while True:
+                try:
+                    response = await client.post(
+                        self.base_url,
+                        headers={
+                            "Authorization": f"Bearer {self.api_key}",
+                            "Content-Type": "application/json",
+                            "HTTP-Referer": "https://github.com/umair-elahi/ai-voice-assistant",
+                            "X-Title": "AI Voice Assistant"
+                        },
+                        json={
+                            "model": self.model,
+                            "messages": messages,
+                            "temperature": 0.7,
+                            "max_tokens": 1000,
+                            "top_p": 0.9,
+                            "frequency_penalty": 0.0,
+                            "presence_penalty": 0.0
+                        }
+                    )
+                    
+                    response.raise_for_status()
+                    result = response.json()
+                    
+                    # Extract AI response
+                    return result["choices"][0]["message"]["content"]
+                
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                        raise
+                    delay = self._backoff_delay(
+                        attempt,
+                        self._parse_retry_after(e.response.headers.get("Retry-After"))
+                    )
+                    if delay is None:
+                        # Upstream asked us to wait longer than we are willing to hold a turn
+                        raise
+                
+                except httpx.TransportError:
+                    if attempt >= self.max_retries:
+                        raise
+                    delay = self._backoff_delay(attempt)
+                
+                attempt += 1
+                print(f"OpenRouter request failed, retrying in {delay:.2f}s (attempt {attempt}/{self.max_retries})")
+                await asyncio.sleep(delay)
+    
+    def _backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """
+        Compute the wait before the next retry
+        
+        Args:
+            attempt: Zero-based number of the attempt that just failed
+            retry_after: Seconds requested by the upstream Retry-After header
+            
+        Returns:
+            Delay in seconds, or None if Retry-After exceeds the maximum delay
+        """
+        delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt)))
+        
+        if retry_after is not None:
+            if retry_after > self.retry_max_delay:
+                return None
+            delay = max(delay, retry_after)
+        
+        return delay
+    
+    @staticmethod
+    def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+        """Parse a Retry-After header given in seconds or as an HTTP date"""
+        if not value:
+            return None
+        
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    
     def clear_conversation(self, conversation_id: str):
         """Clear a specific conversation history"""
         if conversation_id in self.conversations:
@@ -0,0 +1,168 @@
+"""
+Bulk Upload Benchmark
+Author: Umair Elahi
+Description: Measures documents/minute for ingesting a PDF corpus through
+/upload/bulk (as files or one ZIP archive) against looping over /upload
+
+Each mode runs in a fresh process with its own data directories, using the
+backend selected by VECTOR_BACKEND. By default the server's embedding model
+is used; --synthetic swaps in random vectors to time everything but the model.
+
+Usage (from the backend directory):
+    python benchmarks/bulk_upload.py --docs 200 --pages 5
+    VECTOR_BACKEND=numpy python benchmarks/bulk_upload.py --synthetic --workers 4
+"""
+
+import io
+import os
+import sys
+import time
+import zlib
+import random
+import zipfile
+import argparse
+import tempfile
+import multiprocessing
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = ["loop", "bulk", "zip"]
+
+WORDS = (
+    "retrieval vector index document page section query latency embedding "
+    "chunk overlap model voice assistant archive upload server cache batch"
+).split()
+
+
+class SyntheticEmbeddings:
+    """Deterministic random vectors, one per text"""
+    
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+    
+    def __call__(self, input):
+        import numpy as np
+        
+        rng = np.random.default_rng(zlib.crc32(input[0].encode()))
+        return rng.standard_normal((len(input), self.dim)).astype(np.float32).tolist()
+
+
+def make_corpus(docs: int, pages: int) -> list:
+    """Generate (filename, PDF bytes) pairs with a few paragraphs per page"""
+    import fitz  # PyMuPDF
+    
+    rng = random.Random(0)
+    corpus = []
+    for d in range(docs):
+        doc = fitz.open()
+        for _ in range(pages):
+            sentences = [" ".join(rng.choices(WORDS, k=12)).capitalize() + "." for _ in range(30)]
+            page = doc.new_page()
+            page.insert_textbox(fitz.Rect(54, 54, 558, 738), " ".join(sentences), fontsize=9)
+        corpus.append((f"doc_{d:05d}.pdf", doc.tobytes()))
+        doc.close()
+    return corpus
+
+
+def run_mode(mode: str, corpus: list, synthetic: bool, files_per_request: int, env: dict, results):
+    """Ingest the corpus through the API in a fresh process and report timings"""
+    workdir = tempfile.mkdtemp(prefix="bulk_bench_")
+    os.environ.update(env)
+    os.environ.setdefault("OPENROUTER_API_KEY", "benchmark-key")
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    os.environ["CHROMA_DIR"] = os.path.join(workdir, "chroma")
+    os.environ["LOCAL_INDEX_DIR"] = os.path.join(workdir, "local")
+    sys.path.insert(0, BACKEND_DIR)
+    
+    from fastapi.testclient import TestClient
+    import main
+    import vector_store
+    
+    if synthetic:
+        main.create_vector_store = lambda: vector_store.create_vector_store(SyntheticEmbeddings())
+    
+    # Keep per-file logging (including from extraction workers) out of the results
+    os.dup2(os.open(os.devnull, os.O_WRONLY), 1)
+    
+    with TestClient(main.app) as client:
+        while not client.get("/health").json()["ready"]:
+            time.sleep(0.05)
+        
+        # One untimed request starts worker processes and loads the model,
+        # as on a server that has already handled an upload
+        warmup = [("files", ("warmup.pdf", corpus[0][1], "application/pdf"))]
+        if mode == "loop":
+            client.post("/upload", files={"file": warmup[0][1]})
+        else:
+            client.post("/upload/bulk", files=warmup)
+        warmup_chunks = main.vector_store.count_documents()
+        
+        failed = 0
+        start = time.perf_counter()
+        
+        if mode == "loop":
+            for filename, data in corpus:
+                response = client.post("/upload", files={"file": (filename, data, "application/pdf")})
+                failed += response.status_code != 200
+        
+        elif mode == "bulk":
+            step = files_per_request or len(corpus)
+            for i in range(0, len(corpus), step):
+                response = client.post("/upload/bulk", files=[
+                    ("files", (filename, data, "application/pdf")) for filename, data in corpus[i:i + step]
+                ]).json()
+                failed += response["failed"]
+        
+        elif mode == "zip":
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, "w") as archive:
+                for filename, data in corpus:
+                    archive.writestr(filename, data)
+            response = client.post("/upload/bulk", files={"files": ("corpus.zip", buffer.getvalue(), "application/zip")}).json()
+            failed += response["failed"]
+        
+        elapsed = time.perf_counter() - start
+        chunks = main.vector_store.count_documents() - warmup_chunks
+    
+    results.put((elapsed, chunks, failed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bulk PDF ingestion")
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--files-per-request", type=int, default=0, help="Files per bulk request (0 = all)")
+    parser.add_argument("--workers", type=int, help="INGEST_WORKERS for the server")
+    parser.add_argument("--batch-size", type=int, help="INGEST_BATCH_SIZE for the server")
+    parser.add_argument("--synthetic", action="store_true", help="Use random vectors instead of the embedding model")
+    args = parser.parse_args()
+    
+    env = {}
+    if args.workers is not None:
+        env["INGEST_WORKERS"] = str(args.workers)
+    if args.batch_size is not None:
+        env["INGEST_BATCH_SIZE"] = str(args.batch_size)
+    
+    corpus = make_corpus(args.docs, args.pages)
+    size_mb = sum(len(data) for _, data in corpus) / 1024 / 1024
+    print(f"Corpus: {args.docs} PDFs x {args.pages} pages ({size_mb:.1f} MB)")
+    
+    ctx = multiprocessing.get_context("spawn")
+    
+    print(f"{'mode':<6} {'time (s)':>9} {'docs/min':>10} {'chunks':>8} {'failed':>7}")
+    baseline = None
+    for mode in args.modes:
+        results = ctx.Queue()
+        proc = ctx.Process(target=run_mode, args=(mode, corpus, args.synthetic, args.files_per_request, env, results))
+        proc.start()
+        elapsed, chunks, failed = results.get()
+        proc.join()
+        
+        rate = args.docs / elapsed * 60
+        baseline = baseline or rate
+        print(f"{mode:<6} {elapsed:>9.2f} {rate:>10.0f} {chunks:>8} {failed:>7}   ({rate / baseline:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Document Deletion Benchmark
+Author: Umair Elahi
+Description: Measures per-document delete latency, query latency while deletes
+run, and disk reclaimed by compaction, against the old clear-and-reload path
+
+Synthetic vectors stand in for embeddings. The backend is chosen with
+VECTOR_BACKEND as in the server.
+
+Usage (from the backend directory):
+    python benchmarks/document_deletion.py --docs 2000 --chunks-per-doc 50 --delete 400
+    VECTOR_BACKEND=numpy python benchmarks/document_deletion.py
+"""
+
+import os
+import sys
+import time
+import zlib
+import random
+import argparse
+import tempfile
+import threading
+import statistics
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class SyntheticEmbeddings:
+    """Deterministic random vectors keyed by the first text of each batch"""
+    
+    def __init__(self, dim: int):
+        self.dim = dim
+    
+    def __call__(self, input):
+        rng = np.random.default_rng(zlib.crc32(input[0].encode()))
+        return rng.standard_normal((len(input), self.dim)).astype(np.float32).tolist()
+
+
+def percentile(values, q):
+    return sorted(values)[max(0, int(len(values) * q) - 1)] if values else 0.0
+
+
+def build(store, docs: int, chunks_per_doc: int) -> list:
+    """Add synthetic documents and return their IDs"""
+    return [
+        store.add_documents(
+            [f"d{d}c{c}" for c in range(chunks_per_doc)],
+            metadata={"filename": f"doc_{d}.pdf"},
+            document_id=f"doc{d}"
+        )
+        for d in range(docs)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-document deletion and compaction")
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--chunks-per-doc", type=int, default=50)
+    parser.add_argument("--delete", type=int, default=200, help="Documents to delete")
+    parser.add_argument("--dim", type=int, default=384)
+    args = parser.parse_args()
+    
+    workdir = Path(tempfile.mkdtemp(prefix="delete_bench_"))
+    os.environ["CHROMA_DIR"] = str(workdir)
+    os.environ["LOCAL_INDEX_DIR"] = str(workdir)
+    
+    from vector_store import create_vector_store, directory_size
+    
+    # Keep per-call logging out of the results
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    
+    store = create_vector_store(SyntheticEmbeddings(args.dim))
+    start = time.perf_counter()
+    doc_ids = build(store, args.docs, args.chunks_per_doc)
+    build_time = time.perf_counter() - start
+    size_built = directory_size(workdir)
+    
+    # Baseline query latency with no writers
+    idle_latencies = []
+    for i in range(200):
+        t0 = time.perf_counter()
+        store.search(f"q{i}", k=3)
+        idle_latencies.append((time.perf_counter() - t0) * 1000)
+    
+    # Query continuously while documents are deleted
+    busy_latencies = []
+    stop = threading.Event()
+    
+    def query_loop():
+        i = 0
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            store.search(f"q{i}", k=3)
+            busy_latencies.append((time.perf_counter() - t0) * 1000)
+            i += 1
+    
+    querier = threading.Thread(target=query_loop)
+    querier.start()
+    
+    delete_latencies = []
+    for doc_id in random.Random(0).sample(doc_ids, args.delete):
+        t0 = time.perf_counter()
+        store.delete_document(doc_id)
+        delete_latencies.append((time.perf_counter() - t0) * 1000)
+    
+    stop.set()
+    querier.join()
+    size_deleted = directory_size(workdir)
+    
+    start = time.perf_counter()
+    store.compact()
+    compact_time = time.perf_counter() - start
+    size_compacted = directory_size(workdir)
+    
+    # Old path: removing anything meant clearing everything and re-ingesting the rest
+    start = time.perf_counter()
+    store.clear()
+    build(store, args.docs - args.delete, args.chunks_per_doc)
+    reload_time = time.perf_counter() - start
+    
+    sys.stdout = stdout
+    
+    mb = 1024 * 1024
+    print(f"backend: {os.getenv('VECTOR_BACKEND', 'chroma')}, "
+          f"{args.docs} docs x {args.chunks_per_doc} chunks, deleting {args.delete} docs")
+    print(f"build:                        {build_time:8.1f} s")
+    print(f"delete_document p50 / p95:    {statistics.median(delete_latencies):8.2f} / {percentile(delete_latencies, 0.95):.2f} ms")
+    print(f"query p50 / p95 idle:         {statistics.median(idle_latencies):8.2f} / {percentile(idle_latencies, 0.95):.2f} ms")
+    print(f"query p50 / p95 during delete:{statistics.median(busy_latencies):8.2f} / {percentile(busy_latencies, 0.95):.2f} ms "
+          f"({len(busy_latencies)} queries)")
+    print(f"compaction:                   {compact_time:8.1f} s")
+    print(f"disk built / deleted / compacted: {size_built / mb:.1f} / {size_deleted / mb:.1f} / {size_compacted / mb:.1f} MB")
+    print(f"old clear + reload of remaining docs: {reload_time:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Index Backend Benchmark
+Author: Umair Elahi
+Description: Compares build time, query latency, recall@k and peak RSS of the
+ChromaDB HNSW store and the local NumPy/FAISS index at several corpus sizes
+
+Synthetic clustered vectors stand in for embeddings, so the numbers reflect
+the index alone and not the embedding model.
+
+Usage (from the backend directory):
+    python benchmarks/index_backends.py --sizes 10000 100000 1000000
+    python benchmarks/index_backends.py --sizes 100000 --search-ef 50 --M 32
+"""
+
+import os
+import sys
+import time
+import argparse
+import functools
+import resource
+import tempfile
+import statistics
+import multiprocessing
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SEED = 0
+QUERY_SEED = 1
+CLUSTERS = 256
+BATCH = 5000
+
+CONFIGS = [
+    ("chroma-hnsw", {"VECTOR_BACKEND": "chroma"}),
+    ("numpy-flat", {"VECTOR_BACKEND": "numpy"}),
+    ("faiss-flat", {"VECTOR_BACKEND": "faiss", "FAISS_INDEX_TYPE": "flat"}),
+    ("faiss-ivf", {"VECTOR_BACKEND": "faiss", "FAISS_INDEX_TYPE": "ivf"}),
+]
+
+
+@functools.lru_cache(maxsize=None)
+def cluster_centers(dim: int) -> np.ndarray:
+    return np.random.default_rng(SEED).standard_normal((CLUSTERS, dim)).astype(np.float32)
+
+
+def chunk_vector(index: int, dim: int) -> np.ndarray:
+    """Deterministic clustered vector for one chunk, seeded by its index alone"""
+    rng = np.random.default_rng([SEED, index])
+    return cluster_centers(dim)[rng.integers(CLUSTERS)] + 0.5 * rng.standard_normal(dim, dtype=np.float32)
+
+
+def chunk_vectors(start: int, count: int, dim: int) -> np.ndarray:
+    """Vectors for chunks start..start+count, independent of how calls are split"""
+    return np.stack([chunk_vector(i, dim) for i in range(start, start + count)])
+
+
+def query_vectors(count: int, dim: int) -> np.ndarray:
+    """Deterministic query vectors drawn from the same clusters"""
+    centers = cluster_centers(dim)
+    rng = np.random.default_rng(QUERY_SEED)
+    labels = rng.integers(0, CLUSTERS, count)
+    return centers[labels] + 0.5 * rng.standard_normal((count, dim)).astype(np.float32)
+
+
+class SyntheticEmbeddings:
+    """Embedding function that maps "c<i>" and "q<j>" texts to synthetic vectors"""
+    
+    def __init__(self, dim: int, queries: np.ndarray):
+        self.dim = dim
+        self.queries = queries
+    
+    def __call__(self, input):
+        if input[0].startswith("q"):
+            return [self.queries[int(t[1:])].tolist() for t in input]
+        # Stores may embed in slices of any size, so each chunk is generated on its own
+        return [chunk_vector(int(t[1:]), self.dim).tolist() for t in input]
+
+
+def exact_neighbours(size: int, queries: np.ndarray, k: int, space: str) -> np.ndarray:
+    """Brute-force ground truth for recall@k"""
+    if space == "cosine":
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    
+    best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+    best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+    for start in range(0, size, BATCH):
+        block = chunk_vectors(start, min(BATCH, size - start), queries.shape[1])
+        if space == "cosine":
+            block = block / np.linalg.norm(block, axis=1, keepdims=True)
+        
+        dots = queries @ block.T
+        if space == "l2":
+            scores = np.einsum("ij,ij->i", block, block)[None, :] - 2 * dots
+        else:
+            scores = -dots
+        
+        rows = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+        all_rows = np.concatenate([best_rows, rows], axis=1)
+        all_scores = np.concatenate([best_scores, scores], axis=1)
+        keep = np.argpartition(all_scores, k - 1, axis=1)[:, :k]
+        best_rows = np.take_along_axis(all_rows, keep, axis=1)
+        best_scores = np.take_along_axis(all_scores, keep, axis=1)
+    
+    return best_rows
+
+
+def run_config(env: dict, size: int, dim: int, queries: int, k: int, results):
+    """Build one index in a fresh process and report its measurements"""
+    os.environ.update(env)
+    workdir = tempfile.mkdtemp(prefix="index_bench_")
+    os.environ["CHROMA_DIR"] = os.path.join(workdir, "chroma")
+    os.environ["LOCAL_INDEX_DIR"] = os.path.join(workdir, "local")
+    sys.path.insert(0, BACKEND_DIR)
+    
+    from vector_store import create_vector_store, index_settings
+    
+    # Silence startup and per-batch logging from the store
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    
+    query_matrix = query_vectors(queries, dim)
+    store = create_vector_store(SyntheticEmbeddings(dim, query_matrix))
+    
+    start = time.perf_counter()
+    for batch_start in range(0, size, BATCH):
+        count = min(BATCH, size - batch_start)
+        store.add_documents(
+            [f"c{i}" for i in range(batch_start, batch_start + count)],
+            metadata={"filename": "bench.pdf"},
+            document_id=f"batch{batch_start}"
+        )
+    build_time = time.perf_counter() - start
+    sys.stdout = stdout
+    
+    latencies = []
+    found = []
+    for j in range(queries):
+        t0 = time.perf_counter()
+        docs = store.search(f"q{j}", k=k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        found.append({int(d[1:]) for d in docs})
+    
+    truth = exact_neighbours(size, query_matrix, k, index_settings()["space"])
+    recall = statistics.mean(len(found[j] & set(truth[j].tolist())) / k for j in range(queries))
+    
+    # ru_maxrss is in KB on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    
+    results.put((build_time, statistics.median(latencies), sorted(latencies)[int(queries * 0.95) - 1], recall, peak_rss_mb))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vector index backends")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--backends", nargs="+", default=[name for name, _ in CONFIGS])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--space", default=os.getenv("VECTOR_SPACE", "l2"))
+    parser.add_argument("--search-ef", type=int)
+    parser.add_argument("--construction-ef", type=int)
+    parser.add_argument("--M", type=int)
+    parser.add_argument("--nlist", type=int)
+    parser.add_argument("--nprobe", type=int)
+    args = parser.parse_args()
+    
+    overrides = {"VECTOR_SPACE": args.space}
+    for name, value in [
+        ("HNSW_SEARCH_EF", args.search_ef),
+        ("HNSW_CONSTRUCTION_EF", args.construction_ef),
+        ("HNSW_M", args.M),
+        ("FAISS_NLIST", args.nlist),
+        ("FAISS_NPROBE", args.nprobe),
+    ]:
+        if value is not None:
+            overrides[name] = str(value)
+    
+    ctx = multiprocessing.get_context("spawn")
+    
+    print(f"{'backend':<12} {'chunks':>8} {'build (s)':>10} {'p50 (ms)':>9} {'p95 (ms)':>9} {'recall@' + str(args.k):>10} {'peak RSS (MB)':>14}")
+    for size in args.sizes:
+        for name, env in CONFIGS:
+            if name not in args.backends:
+                continue
+            
+            # Scale IVF lists with the corpus unless set explicitly
+            env = {**env, **overrides}
+            env.setdefault("FAISS_NLIST", str(max(1, min(int(4 * size ** 0.5), size // 39))))
+            
+            results = ctx.Queue()
+            proc = ctx.Process(target=run_config, args=(env, size, args.dim, args.queries, args.k, results))
+            proc.start()
+            proc.join()
+            
+            if proc.exitcode != 0:
+                print(f"{name:<12} {size:>8} failed (exit code {proc.exitcode})")
+                continue
+            
+            build_time, p50, p95, recall, rss = results.get()
+            print(f"{name:<12} {size:>8} {build_time:>10.1f} {p50:>9.2f} {p95:>9.2f} {recall:>10.3f} {rss:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
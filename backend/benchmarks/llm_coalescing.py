@@ -0,0 +1,108 @@
+"""
+LLM Coalescing Benchmark
+Author: Umair Elahi
+Description: Measures upstream call counts and error rates for a burst of
+duplicate questions against a mock OpenRouter upstream
+
+Usage (from the backend directory):
+    python benchmarks/llm_coalescing.py --clients 50 --failure-rate 0.3
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENROUTER_API_KEY", "benchmark-key")
+
+from agent import AIAgent  # noqa: E402
+
+
+class EmptyStore:
+    """Vector store stand-in with no documents, so only the LLM path is measured"""
+    
+    def is_initialized(self) -> bool:
+        return False
+
+
+class MockUpstream:
+    """Mock OpenRouter that answers slowly and fails a fraction of calls with 503"""
+    
+    def __init__(self, latency: float, failure_rate: float, retry_after: float):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.retry_after = retry_after
+        self.calls = 0
+    
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        
+        if random.random() < self.failure_rate:
+            headers = {"Retry-After": str(self.retry_after)} if self.retry_after else {}
+            return httpx.Response(503, headers=headers, text="upstream overloaded")
+        
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": "mock answer"}}]
+        })
+
+
+async def run_burst(agent: AIAgent, clients: int, question: str, coalesce: bool) -> int:
+    """Fire identical questions concurrently and return the number of failed turns"""
+    if coalesce:
+        results = await asyncio.gather(*[
+            agent.generate_response(question) for _ in range(clients)
+        ])
+        return sum(1 for r in results if "error" in r)
+    
+    # Baseline: one upstream call per client, no sharing
+    messages = [
+        {"role": "system", "content": agent._get_system_prompt()},
+        {"role": "user", "content": question}
+    ]
+    results = await asyncio.gather(*[
+        agent._post_with_retry(messages) for _ in range(clients)
+    ], return_exceptions=True)
+    return sum(1 for r in results if isinstance(r, Exception))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark LLM request coalescing and retries")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--bursts", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--failure-rate", type=float, default=0.3)
+    parser.add_argument("--retry-after", type=float, default=0.0)
+    args = parser.parse_args()
+    
+    random.seed(0)
+    
+    scenarios = [
+        ("baseline (no coalescing, no retries)", False, 0),
+        ("coalescing + retries", True, int(os.getenv("LLM_MAX_RETRIES", 3))),
+    ]
+    
+    print(f"{'scenario':<40} {'upstream calls':>15} {'failed turns':>13} {'error rate':>11} {'time (s)':>9}")
+    for name, coalesce, retries in scenarios:
+        upstream = MockUpstream(args.latency, args.failure_rate, args.retry_after)
+        agent = AIAgent(EmptyStore(), transport=httpx.MockTransport(upstream.handler))
+        agent.max_retries = retries
+        agent.retry_base_delay = 0.05
+        
+        failed = 0
+        start = time.perf_counter()
+        for i in range(args.bursts):
+            failed += await run_burst(agent, args.clients, f"What is section {i} about?", coalesce)
+        elapsed = time.perf_counter() - start
+        
+        turns = args.clients * args.bursts
+        print(f"{name:<40} {upstream.calls:>15} {failed:>13} {failed / turns:>10.1%} {elapsed:>9.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,160 @@
+"""
+OCR Extraction Benchmark
+Author: Umair Elahi
+Description: Measures PDF extraction throughput (pages/second) on native
+multi-column, scanned and mixed corpora, with a cold and a warm OCR cache
+
+The warm runs re-process the same files, once with the same settings and
+once with a different CHUNK_SIZE, which should both skip OCR entirely.
+Each configuration runs in a fresh process with its own cache directory.
+
+Usage (from the backend directory):
+    python benchmarks/ocr_extraction.py --docs 20 --pages 10
+    python benchmarks/ocr_extraction.py --corpora scanned --workers 1 4
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import multiprocessing
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CORPORA = ["native", "scanned", "mixed"]
+
+WORDS = (
+    "retrieval vector index document page section query latency embedding "
+    "chunk overlap model voice assistant archive upload server cache batch"
+).split()
+
+
+def paragraph(rng: random.Random, sentences: int) -> str:
+    return " ".join(" ".join(rng.choices(WORDS, k=10)).capitalize() + "." for _ in range(sentences))
+
+
+def add_native_page(doc, rng: random.Random):
+    """Two-column page with a full-width title"""
+    import fitz  # PyMuPDF
+    
+    page = doc.new_page()
+    page.insert_textbox(fitz.Rect(54, 40, 558, 70), paragraph(rng, 1), fontsize=12)
+    page.insert_textbox(fitz.Rect(54, 80, 296, 760), paragraph(rng, 25), fontsize=9)
+    page.insert_textbox(fitz.Rect(316, 80, 558, 760), paragraph(rng, 25), fontsize=9)
+
+
+def add_scanned_page(doc, rng: random.Random, dpi: int):
+    """Image-only page: a native page rendered to a bitmap, as a scanner would produce"""
+    import fitz  # PyMuPDF
+    
+    source = fitz.open()
+    add_native_page(source, rng)
+    pixmap = source[0].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    source.close()
+    
+    page = doc.new_page()
+    page.insert_image(page.rect, pixmap=pixmap)
+
+
+def make_corpus(kind: str, docs: int, pages: int, scan_dpi: int, directory: str) -> list:
+    """Write a corpus of PDFs and return their paths"""
+    import fitz  # PyMuPDF
+    
+    rng = random.Random(kind)
+    paths = []
+    for d in range(docs):
+        doc = fitz.open()
+        for p in range(pages):
+            if kind == "scanned" or (kind == "mixed" and p % 2):
+                add_scanned_page(doc, rng, scan_dpi)
+            else:
+                add_native_page(doc, rng)
+        
+        path = os.path.join(directory, f"{kind}_{d:04d}.pdf")
+        doc.save(path)
+        doc.close()
+        paths.append(path)
+    return paths
+
+
+def run_config(paths: list, workers: int, results):
+    """Extract the corpus cold, warm, and warm with a new CHUNK_SIZE"""
+    os.environ["EXTRACTION_CACHE_DIR"] = tempfile.mkdtemp(prefix="ocr_cache_")
+    os.environ["OCR_WORKERS"] = str(workers)
+    sys.path.insert(0, BACKEND_DIR)
+    
+    import pdf_processor
+    
+    # Keep per-file logging out of the results
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    
+    timings = []
+    for chunk_size in (1000, 1000, 500):
+        os.environ["CHUNK_SIZE"] = str(chunk_size)
+        processor = pdf_processor.PDFProcessor()
+        
+        chunks = 0
+        start = time.perf_counter()
+        for path in paths:
+            chunks += len(processor.process_pdf_chunks(path))
+        timings.append((time.perf_counter() - start, chunks))
+    
+    # Worker processes must be stopped before this process can exit
+    pdf_processor.shutdown_ocr_pool()
+    sys.stdout = stdout
+    results.put(timings)
+
+
+def tesseract_available() -> bool:
+    """Check whether PyMuPDF can run OCR here"""
+    import fitz  # PyMuPDF
+    
+    doc = fitz.open()
+    page = doc.new_page()
+    try:
+        page.get_textpage_ocr(full=True)
+        return True
+    except Exception:
+        return False
+    finally:
+        doc.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark layout-aware and OCR PDF extraction")
+    parser.add_argument("--docs", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--corpora", nargs="+", default=CORPORA, choices=CORPORA)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1], help="OCR_WORKERS values")
+    parser.add_argument("--scan-dpi", type=int, default=150)
+    args = parser.parse_args()
+    
+    if not tesseract_available():
+        print("Tesseract not found: scanned pages yield no text and cold timings exclude OCR")
+    
+    workdir = tempfile.mkdtemp(prefix="ocr_bench_")
+    ctx = multiprocessing.get_context("spawn")
+    total_pages = args.docs * args.pages
+    
+    print(f"{'corpus':<8} {'workers':>7} {'cold p/s':>9} {'warm p/s':>9} {'rechunk p/s':>12} {'chunks':>7}")
+    for kind in args.corpora:
+        paths = make_corpus(kind, args.docs, args.pages, args.scan_dpi, workdir)
+        
+        for workers in sorted(set(args.workers)):
+            results = ctx.Queue()
+            proc = ctx.Process(target=run_config, args=(paths, workers, results))
+            proc.start()
+            (cold, chunks), (warm, _), (rechunk, _) = results.get()
+            proc.join()
+            
+            print(
+                f"{kind:<8} {workers:>7} {total_pages / cold:>9.1f} {total_pages / warm:>9.1f} "
+                f"{total_pages / rechunk:>12.1f} {chunks:>7}"
+            )
+
+
+if __name__ == "__main__":
+    main()
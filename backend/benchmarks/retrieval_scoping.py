@@ -0,0 +1,101 @@
+"""
+Retrieval Scoping Benchmark
+Author: Umair Elahi
+Description: Compares query latency and precision of whole-corpus search
+against document-scoped search as the corpus grows
+
+Usage (from the backend directory):
+    python benchmarks/retrieval_scoping.py --docs 100 1000 5000
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TOPICS = [
+    "invoice", "contract", "warranty", "insurance", "mortgage", "payroll",
+    "shipping", "inventory", "compliance", "audit", "pension", "lease"
+]
+FILLER = "the terms described in this section apply to all parties and remain in effect".split()
+
+
+def make_chunk(doc_num: int, chunk_num: int, topic: str) -> str:
+    """Build a synthetic chunk; every document shares vocabulary with many others"""
+    words = random.choices(FILLER, k=40)
+    return f"Document {doc_num} part {chunk_num} about the {topic} policy. " + " ".join(words)
+
+
+def run(num_docs: int, chunks_per_doc: int, queries: int, k: int):
+    # Each size gets a fresh store on disk
+    os.environ["CHROMA_DIR"] = tempfile.mkdtemp(prefix="chroma_bench_")
+    from vector_store import VectorStore
+    
+    store = VectorStore()
+    
+    doc_ids = []
+    doc_topics = []
+    start = time.perf_counter()
+    for doc_num in range(num_docs):
+        topic = TOPICS[doc_num % len(TOPICS)]
+        texts = [make_chunk(doc_num, i, topic) for i in range(chunks_per_doc)]
+        metadatas = [{"page": i + 1, "section": ""} for i in range(chunks_per_doc)]
+        doc_ids.append(store.add_documents(
+            texts,
+            metadata={"filename": f"doc_{doc_num}.pdf"},
+            metadatas=metadatas
+        ))
+        doc_topics.append(topic)
+    build_time = time.perf_counter() - start
+    
+    results = {}
+    for scoped in (False, True):
+        latencies = []
+        hits = 0
+        returned = 0
+        for _ in range(queries):
+            target = random.randrange(num_docs)
+            query = f"What does the {doc_topics[target]} policy say?"
+            
+            t0 = time.perf_counter()
+            docs = store.search(query, k=k, document_ids=[doc_ids[target]] if scoped else None)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            
+            returned += len(docs)
+            hits += sum(1 for d in docs if d.startswith(f"Document {target} "))
+        
+        results[scoped] = (
+            statistics.median(latencies),
+            sorted(latencies)[int(len(latencies) * 0.95) - 1],
+            hits / returned if returned else 0.0
+        )
+    
+    return build_time, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scoped vs unscoped retrieval")
+    parser.add_argument("--docs", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--chunks-per-doc", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+    
+    random.seed(0)
+    
+    print(f"{'docs':>6} {'chunks':>7} {'build (s)':>10} {'mode':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'precision':>10}")
+    for num_docs in args.docs:
+        build_time, results = run(num_docs, args.chunks_per_doc, args.queries, args.k)
+        for scoped, (p50, p95, precision) in results.items():
+            mode = "scoped" if scoped else "corpus"
+            print(f"{num_docs:>6} {num_docs * args.chunks_per_doc:>7} {build_time:>10.1f} "
+                  f"{mode:>9} {p50:>9.2f} {p95:>9.2f} {precision:>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
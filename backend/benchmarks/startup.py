@@ -0,0 +1,146 @@
+"""
+Startup Benchmark
+Author: Umair Elahi
+Description: Profiles import time of the server module and measures cold start
+to the first served request and to full readiness
+
+Exits with status 1 when importing main takes longer than --max-import-ms,
+so it can be used as a regression check.
+
+Usage (from the backend directory):
+    python benchmarks/startup.py
+    python benchmarks/startup.py --max-import-ms 500 --top 15
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def server_env() -> dict:
+    """Environment for child processes, with throwaway data directories"""
+    workdir = tempfile.mkdtemp(prefix="startup_bench_")
+    env = dict(os.environ)
+    env.setdefault("OPENROUTER_API_KEY", "benchmark-key")
+    env["CHROMA_DIR"] = os.path.join(workdir, "chroma")
+    env["LOCAL_INDEX_DIR"] = os.path.join(workdir, "local")
+    env["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    return env
+
+
+def profile_imports(top: int):
+    """Run `python -X importtime -c "import main"` and return (total µs, slowest direct imports)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR,
+        env=server_env(),
+        capture_output=True,
+        text=True
+    )
+    
+    # Children are printed (indented) before their parent, so collect the
+    # direct children of each top-level module until that module appears
+    children = []
+    entries = []
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time: <self us> | <cumulative us> | <module>"
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == "main":
+                total = int(cumulative_us)
+                entries = children
+            children = []
+        elif depth == 1:
+            children.append((int(cumulative_us), name.strip()))
+    
+    entries.sort(reverse=True)
+    return total, entries[:top]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def cold_start(timeout: float):
+    """
+    Start uvicorn and poll /health
+    
+    Returns:
+        Seconds to first served request, to components ready, and to warm-up done
+    """
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=server_env(),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    
+    first_response = ready = warm = None
+    try:
+        with httpx.Client(timeout=1.0) as client:
+            while time.perf_counter() - start < timeout:
+                try:
+                    health = client.get(f"http://127.0.0.1:{port}/health").json()
+                except httpx.TransportError:
+                    time.sleep(0.01)
+                    continue
+                
+                elapsed = time.perf_counter() - start
+                first_response = first_response or elapsed
+                if health.get("ready") and ready is None:
+                    ready = elapsed
+                if health.get("status") in ("healthy", "degraded", "error"):
+                    warm = elapsed
+                    break
+                time.sleep(0.01)
+    finally:
+        proc.terminate()
+        proc.wait()
+    
+    return first_response, ready, warm
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile server import time and cold start")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports made by main to list")
+    parser.add_argument("--max-import-ms", type=float, default=1000.0)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+    
+    total_us, slowest = profile_imports(args.top)
+    print(f"import main: {total_us / 1000:.0f} ms")
+    for cumulative_us, name in slowest:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+    
+    def fmt(seconds):
+        return f"{seconds:.2f} s" if seconds is not None else "timed out"
+    
+    first_response, ready, warm = cold_start(args.timeout)
+    print(f"cold start to first /health response: {fmt(first_response)}")
+    print(f"cold start to components ready:       {fmt(ready)}")
+    print(f"cold start to embedding model warm:   {fmt(warm)}")
+    
+    if total_us / 1000 > args.max_import_ms:
+        print(f"FAIL: import main exceeds {args.max_import_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,661 @@
+"""
+Local Index Module
+Author: Umair Elahi
+Description: Alternate vector store backed by a memory-mapped float32 matrix,
+searched with NumPy (exact flat) or FAISS-CPU (flat or IVF)
+"""
+
+import os
+import json
+import threading
+from typing import List, Dict, Optional, Tuple
+from pathlib import Path
+
+import numpy as np
+from chromadb.utils import embedding_functions
+from dotenv import load_dotenv
+
+from vector_store import index_settings, compaction_due, directory_size, flatten_documents, INGEST_BATCH_SIZE
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+load_dotenv()
+
+# Rows scored per block in the NumPy path, bounding temporary memory
+SEARCH_BLOCK_ROWS = 65536
+
+
+class LocalIndexStore:
+    """
+    Vector store with the same interface as VectorStore, kept on local disk
+    
+    Layout of LOCAL_INDEX_DIR:
+        index.json    - dimension and distance space
+        vectors.f32   - row-major float32 embeddings, one row per chunk
+        chunks.jsonl  - one {"id", "text", "metadata"} line per chunk
+        deleted.json  - IDs of deleted documents whose rows are not compacted yet
+    
+    Metadata stays in memory for filtering; texts are read from disk only
+    for the rows a search returns.
+    """
+    
+    def __init__(self, engine: str = "numpy", embedding_function=None):
+        if engine == "faiss" and faiss is None:
+            raise ValueError("VECTOR_BACKEND=faiss requires faiss-cpu (pip install faiss-cpu)")
+        
+        self.engine = engine
+        self.index_dir = Path(os.getenv("LOCAL_INDEX_DIR", "./local_index"))
+        self.index_dir.mkdir(exist_ok=True)
+        
+        self.space = index_settings()["space"]
+        self.index_type = os.getenv("FAISS_INDEX_TYPE", "flat").lower()
+        self.nlist = int(os.getenv("FAISS_NLIST", 1024))
+        self.nprobe = int(os.getenv("FAISS_NPROBE", 16))
+        
+        self.embedding_function = embedding_function or embedding_functions.DefaultEmbeddingFunction()
+        
+        self._info_path = self.index_dir / "index.json"
+        self._vectors_path = self.index_dir / "vectors.f32"
+        self._chunks_path = self.index_dir / "chunks.jsonl"
+        self._deleted_path = self.index_dir / "deleted.json"
+        
+        # _lock guards in-memory state and is held by every search; writers
+        # (add, delete, compact) are serialized by _write_lock and only take
+        # _lock for the short moment they publish new state
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        
+        self._recover_compaction()
+        self._load()
+        print(f"Local index initialized (engine={self.engine}, space={self.space}, chunks={self.count_documents()})")
+    
+    def _recover_compaction(self):
+        """Finish or undo a compaction that was interrupted by a crash"""
+        tmp_vectors = self._vectors_path.with_suffix(".f32.tmp")
+        tmp_chunks = self._chunks_path.with_suffix(".jsonl.tmp")
+        
+        if tmp_vectors.exists():
+            # The swap had not started, so the old files are intact
+            tmp_vectors.unlink()
+            if tmp_chunks.exists():
+                tmp_chunks.unlink()
+            print("Discarded an interrupted local index compaction")
+        elif tmp_chunks.exists():
+            # Vectors were already swapped; the compacted chunk records were complete
+            os.replace(tmp_chunks, self._chunks_path)
+            print("Finished an interrupted local index compaction")
+    
+    def _load(self):
+        """Load index info, chunk metadata and the vector matrix from disk"""
+        self.dim: Optional[int] = None
+        self._metadatas: List[Dict] = []
+        self._offsets: List[int] = []
+        self._rows_by_document: Dict[str, List[int]] = {}
+        
+        if self._info_path.exists():
+            info = json.loads(self._info_path.read_text())
+            self.dim = info["dim"]
+            if info["space"] != self.space:
+                print(f"Local index was built with space={info['space']}, ignoring VECTOR_SPACE={self.space}")
+                self.space = info["space"]
+        
+        metadatas = []
+        records_end = 0
+        if self._chunks_path.exists():
+            with open(self._chunks_path, "rb") as f:
+                for line in f:
+                    try:
+                        meta = json.loads(line)["metadata"]
+                    except (ValueError, KeyError):
+                        break
+                    if not line.endswith(b"\n"):
+                        break
+                    self._offsets.append(records_end)
+                    metadatas.append(meta)
+                    records_end += len(line)
+        
+        # A crash mid-append can leave a torn last record or vector rows
+        # without records; cut both files back to the last complete chunk
+        if self.dim is not None:
+            row_size = self.dim * np.dtype(np.float32).itemsize
+            vectors_size = self._vectors_path.stat().st_size if self._vectors_path.exists() else 0
+            rows = min(len(metadatas), vectors_size // row_size)
+            if rows < len(metadatas):
+                records_end = self._offsets[rows]
+                del self._offsets[rows:]
+                del metadatas[rows:]
+            if vectors_size > rows * row_size:
+                print(f"Dropping {vectors_size // row_size - rows} vector rows without chunk records")
+                os.truncate(self._vectors_path, rows * row_size)
+        
+        if self._chunks_path.exists() and self._chunks_path.stat().st_size > records_end:
+            print(f"Dropping incomplete chunk records after byte {records_end}")
+            os.truncate(self._chunks_path, records_end)
+        
+        for meta in metadatas:
+            self._track(meta)
+        
+        # Rows of deleted documents stay on disk until compaction
+        self._deleted_documents = set()
+        if self._deleted_path.exists():
+            # IDs whose rows are gone were compacted away before deleted.json was rewritten
+            deleted_documents = json.loads(self._deleted_path.read_text())
+            self._deleted_documents = {d for d in deleted_documents if d in self._rows_by_document}
+        
+        self._deleted = np.zeros(len(self._metadatas), dtype=bool)
+        for document_id in self._deleted_documents:
+            self._deleted[self._rows_by_document.pop(document_id, [])] = True
+        
+        self._open_matrix()
+        self._faiss_index = self._make_faiss_index(self._matrix)
+        self._faiss_params = None
+    
+    def _track(self, meta: Dict):
+        """Append a chunk's metadata and index its row by document ID"""
+        self._rows_by_document.setdefault(meta["document_id"], []).append(len(self._metadatas))
+        self._metadatas.append(meta)
+    
+    def _open_matrix(self, first_new_row: int = 0):
+        """
+        Memory-map the vector file and cache squared row norms for L2
+        
+        Args:
+            first_new_row: Rows before this one already have cached norms
+        """
+        rows = len(self._metadatas)
+        if rows == 0 or self.dim is None:
+            self._matrix = np.zeros((0, self.dim or 0), dtype=np.float32)
+            self._sq_norms = np.zeros(0, dtype=np.float32)
+            return
+        
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        
+        # Norms are only used by L2 scoring; other spaces keep an empty array
+        if self.space != "l2":
+            self._sq_norms = np.zeros(0, dtype=np.float32)
+            return
+        
+        known = self._sq_norms[:first_new_row] if first_new_row else np.zeros(0, dtype=np.float32)
+        self._sq_norms = np.concatenate([known] + [
+            np.einsum("ij,ij->i", self._matrix[i:i + SEARCH_BLOCK_ROWS], self._matrix[i:i + SEARCH_BLOCK_ROWS])
+            for i in range(first_new_row, rows, SEARCH_BLOCK_ROWS)
+        ])
+    
+    def _make_faiss_index(self, matrix: np.ndarray):
+        """
+        Build a FAISS index over a vector matrix (FAISS engine only)
+        
+        Returns:
+            FAISS index, or None when searches should use the NumPy path
+        """
+        if self.engine != "faiss" or len(matrix) == 0:
+            return None
+        
+        # IVF needs enough points to train its coarse quantizer; until then
+        # searches use the exact NumPy path
+        if self.index_type == "ivf" and len(matrix) < self.nlist * 39:
+            return None
+        
+        metric = faiss.METRIC_L2 if self.space == "l2" else faiss.METRIC_INNER_PRODUCT
+        
+        if self.index_type == "ivf":
+            quantizer = faiss.IndexFlat(self.dim, metric)
+            index = faiss.IndexIVFFlat(quantizer, self.dim, self.nlist, metric)
+            
+            # Train on a sample; k-means gains little beyond a few hundred points per list
+            sample = min(len(matrix), self.nlist * 256)
+            rows = np.random.default_rng(0).choice(len(matrix), sample, replace=False)
+            index.train(np.ascontiguousarray(matrix[np.sort(rows)]))
+            index.nprobe = self.nprobe
+        elif self.index_type == "flat":
+            index = faiss.IndexFlat(self.dim, metric)
+        else:
+            raise ValueError(f"Unknown FAISS_INDEX_TYPE: {self.index_type}")
+        
+        for i in range(0, len(matrix), SEARCH_BLOCK_ROWS):
+            index.add(np.ascontiguousarray(matrix[i:i + SEARCH_BLOCK_ROWS]))
+        
+        return index
+    
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts as a float32 matrix, normalised for cosine space"""
+        vectors = np.asarray(self.embedding_function(input=texts), dtype=np.float32)
+        
+        if self.space == "cosine":
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.maximum(norms, 1e-12)
+        
+        return vectors
+    
+    def add_documents(
+        self,
+        texts: List[str],
+        metadata: Optional[Dict] = None,
+        metadatas: Optional[List[Dict]] = None,
+        document_id: Optional[str] = None
+    ) -> str:
+        """
+        Add documents to vector store
+        
+        Args:
+            texts: List of text chunks
+            metadata: Optional metadata shared by all chunks
+            metadatas: Optional per-chunk metadata (e.g. page, section)
+            document_id: Optional ID of the source document (generated if omitted)
+        
+        Returns:
+            Document ID the chunks were stored under
+        """
+        return self.add_document_batch([{
+            "texts": texts,
+            "metadata": metadata,
+            "metadatas": metadatas,
+            "document_id": document_id
+        }])[0]
+    
+    def add_document_batch(self, documents: List[Dict]) -> List[str]:
+        """
+        Add several documents, embedding and appending their chunks together
+        
+        Chunks from all documents are embedded and written in slices of
+        INGEST_BATCH_SIZE, so many small files cost a few large calls
+        instead of one each.
+        If a slice fails, the documents' chunks already written are deleted
+        before the error is raised.
+        
+        Args:
+            documents: Dicts with "texts" and optional "metadata", "metadatas"
+                and "document_id", as for add_documents
+        
+        Returns:
+            Document ID of each document, in order
+        """
+        document_ids: List[str] = []
+        written = False
+        try:
+            document_ids, ids, texts, metadatas = flatten_documents(documents)
+            
+            for start in range(0, len(texts), INGEST_BATCH_SIZE):
+                end = start + INGEST_BATCH_SIZE
+                self._append(ids[start:end], texts[start:end], metadatas[start:end], self._embed(texts[start:end]))
+                written = True
+            
+            if texts:
+                print(f"Added {len(texts)} documents to local index")
+            return document_ids
+        
+        except Exception as e:
+            print(f"Error adding documents: {str(e)}")
+            # Remove slices written before the failure so no chunks are left
+            # under document IDs the caller never received
+            if written:
+                for document_id in document_ids:
+                    try:
+                        self.delete_document(document_id)
+                    except Exception:
+                        pass
+            raise
+    
+    def _append(self, ids: List[str], texts: List[str], chunk_metadatas: List[Dict], vectors: np.ndarray):
+        """Append embedded chunks to the files on disk and publish the new rows"""
+        with self._write_lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._info_path.write_text(json.dumps({"dim": self.dim, "space": self.space}))
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+            
+            lines = [
+                (json.dumps({
+                    "id": chunk_id,
+                    "text": text,
+                    "metadata": meta
+                }) + "\n").encode()
+                for chunk_id, text, meta in zip(ids, texts, chunk_metadatas)
+            ]
+            
+            # Append vectors and chunk records; existing rows and offsets are
+            # untouched, and a failed write is cut back so rows stay paired
+            # with their records
+            vectors_size = self._vectors_path.stat().st_size if self._vectors_path.exists() else 0
+            chunks_size = self._chunks_path.stat().st_size if self._chunks_path.exists() else 0
+            try:
+                with open(self._vectors_path, "ab") as f:
+                    f.write(vectors.tobytes())
+                
+                offset = chunks_size
+                new_offsets = []
+                with open(self._chunks_path, "ab") as f:
+                    for line in lines:
+                        f.write(line)
+                        new_offsets.append(offset)
+                        offset += len(line)
+            except Exception:
+                for path, size in ((self._vectors_path, vectors_size), (self._chunks_path, chunks_size)):
+                    if path.exists():
+                        os.truncate(path, size)
+                raise
+            
+            with self._lock:
+                first_new_row = len(self._metadatas)
+                self._offsets.extend(new_offsets)
+                for meta in chunk_metadatas:
+                    self._track(meta)
+                self._deleted = np.concatenate([self._deleted, np.zeros(len(texts), dtype=bool)])
+                self._open_matrix(first_new_row)
+                
+                if self._faiss_index is None:
+                    self._faiss_index = self._make_faiss_index(self._matrix)
+                else:
+                    self._faiss_index.add(np.ascontiguousarray(self._matrix[first_new_row:]))
+    
+    def search(
+        self,
+        query: str,
+        k: int = 3,
+        document_ids: Optional[List[str]] = None,
+        filename: Optional[str] = None,
+        page_range: Optional[Tuple[int, int]] = None
+    ) -> List[str]:
+        """
+        Search for relevant documents
+        
+        Unfiltered searches use the FAISS index when one is built. Filtered
+        searches score only the matching rows exactly, which is cheaper than
+        over-fetching from the ANN index when a filter selects a few documents.
+        
+        Args:
+            query: Search query
+            k: Number of results to return
+            document_ids: Only search chunks from these documents
+            filename: Only search chunks from this file
+            page_range: Only search chunks from pages in (first, last), inclusive
+        
+        Returns:
+            List of relevant document texts
+        """
+        try:
+            if not self.is_initialized():
+                return []
+            
+            query_vector = self._embed([query])[0]
+            
+            with self._lock:
+                if document_ids or filename or page_range:
+                    # Narrow to the requested documents first, then check the rest;
+                    # deleted documents are no longer in _rows_by_document
+                    if document_ids:
+                        candidates = sorted(
+                            row for doc_id in set(document_ids)
+                            for row in self._rows_by_document.get(doc_id, [])
+                        )
+                    else:
+                        candidates = np.flatnonzero(~self._deleted)
+                    rows = np.array([
+                        i for i in candidates
+                        if self._matches(self._metadatas[i], document_ids, filename, page_range)
+                    ], dtype=np.int64)
+                    top_rows = self._exact_search(query_vector, k, rows)
+                elif self._faiss_index is not None:
+                    _, found = self._faiss_index.search(
+                        query_vector[None, :],
+                        min(k, len(self._metadatas)),
+                        params=self._search_params()
+                    )
+                    top_rows = [int(i) for i in found[0] if i >= 0]
+                else:
+                    top_rows = self._exact_search(query_vector, k)
+                
+                return [self._read_text(i) for i in top_rows]
+        
+        except Exception as e:
+            print(f"Error searching documents: {str(e)}")
+            return []
+    
+    def _search_params(self):
+        """FAISS search parameters that skip deleted rows (None if nothing is deleted)"""
+        if not self._deleted.any():
+            return None
+        
+        if self._faiss_params is None:
+            # Keep both selectors referenced; the parameters object does not own them
+            self._faiss_deleted_selector = faiss.IDSelectorBatch(np.flatnonzero(self._deleted).astype(np.int64))
+            self._faiss_live_selector = faiss.IDSelectorNot(self._faiss_deleted_selector)
+            if self.index_type == "ivf":
+                self._faiss_params = faiss.SearchParametersIVF(sel=self._faiss_live_selector, nprobe=self.nprobe)
+            else:
+                self._faiss_params = faiss.SearchParameters(sel=self._faiss_live_selector)
+        
+        return self._faiss_params
+    
+    def _matches(
+        self,
+        meta: Dict,
+        document_ids: Optional[List[str]],
+        filename: Optional[str],
+        page_range: Optional[Tuple[int, int]]
+    ) -> bool:
+        """Check a chunk's metadata against search filters"""
+        if document_ids and meta.get("document_id") not in document_ids:
+            return False
+        if filename and meta.get("filename") != filename:
+            return False
+        if page_range:
+            page = meta.get("page")
+            if page is None or not page_range[0] <= page <= page_range[1]:
+                return False
+        return True
+    
+    def _exact_search(self, query_vector: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> List[int]:
+        """
+        Brute-force top-k over all live rows, or over the given candidate rows
+        
+        Returns:
+            Row numbers ordered from closest to farthest
+        """
+        total = len(self._metadatas) if rows is None else len(rows)
+        best_rows = np.zeros(0, dtype=np.int64)
+        best_scores = np.zeros(0, dtype=np.float32)
+        
+        for start in range(0, total, SEARCH_BLOCK_ROWS):
+            if rows is None:
+                block_rows = np.arange(start, min(start + SEARCH_BLOCK_ROWS, total))
+                block = self._matrix[start:start + SEARCH_BLOCK_ROWS]
+            else:
+                block_rows = rows[start:start + SEARCH_BLOCK_ROWS]
+                block = self._matrix[block_rows]
+            
+            # Lower score = closer for every space
+            dots = block @ query_vector
+            if self.space == "l2":
+                scores = self._sq_norms[block_rows] - 2 * dots
+            else:
+                scores = -dots
+            
+            if rows is None:
+                live = ~self._deleted[block_rows]
+                block_rows, scores = block_rows[live], scores[live]
+            
+            candidate_rows = np.concatenate([best_rows, block_rows])
+            candidate_scores = np.concatenate([best_scores, scores])
+            if len(candidate_scores) > k:
+                keep = np.argpartition(candidate_scores, k - 1)[:k]
+                candidate_rows, candidate_scores = candidate_rows[keep], candidate_scores[keep]
+            best_rows, best_scores = candidate_rows, candidate_scores
+        
+        order = np.argsort(best_scores, kind="stable")
+        return [int(i) for i in best_rows[order]]
+    
+    def _read_text(self, row: int) -> str:
+        """Read one chunk's text from disk"""
+        with open(self._chunks_path, "rb") as f:
+            f.seek(self._offsets[row])
+            return json.loads(f.readline())["text"]
+    
+    def warm_up(self):
+        """Load the embedding model so the first upload or query does not pay for it"""
+        self._embed(["warm up"])
+        print("Local index warmed up")
+    
+    def delete_document(self, document_id: str) -> int:
+        """
+        Delete all chunks of one document
+        
+        Rows are tombstoned, which is cheap and leaves the files untouched;
+        compact() rewrites the files without them.
+        
+        Args:
+            document_id: ID returned by add_documents
+        
+        Returns:
+            Number of chunks deleted (0 if the document was not found)
+        """
+        try:
+            with self._write_lock:
+                with self._lock:
+                    rows = self._rows_by_document.pop(document_id, [])
+                    if not rows:
+                        return 0
+                    
+                    self._deleted[rows] = True
+                    self._deleted_documents.add(document_id)
+                    self._faiss_params = None
+                
+                self._save_deleted()
+            
+            print(f"Deleted {len(rows)} chunks of document {document_id}")
+            return len(rows)
+        
+        except Exception as e:
+            print(f"Error deleting document: {str(e)}")
+            raise
+    
+    def _save_deleted(self):
+        """Persist deleted document IDs atomically"""
+        tmp_path = self._deleted_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(sorted(self._deleted_documents)))
+        os.replace(tmp_path, self._deleted_path)
+    
+    def needs_compaction(self) -> bool:
+        """Check if enough chunks were deleted to make compaction worthwhile"""
+        return compaction_due(int(self._deleted.sum()), self.count_documents())
+    
+    def compact(self) -> int:
+        """
+        Rewrite the index files without deleted rows
+        
+        New files are written next to the old ones while searches continue
+        against the old state; the swap at the end holds the search lock only
+        briefly. Adds and deletes wait until compaction finishes.
+        
+        Returns:
+            Bytes reclaimed in LOCAL_INDEX_DIR (0 if a compaction was already running)
+        """
+        if not self._compact_lock.acquire(blocking=False):
+            return 0
+        
+        try:
+            size_before = directory_size(self.index_dir)
+            
+            with self._write_lock:
+                if not self._deleted.any():
+                    return 0
+                
+                keep = np.flatnonzero(~self._deleted)
+                tmp_vectors = self._vectors_path.with_suffix(".f32.tmp")
+                tmp_chunks = self._chunks_path.with_suffix(".jsonl.tmp")
+                
+                # Copy live vectors block by block
+                with open(tmp_vectors, "wb") as f:
+                    for i in range(0, len(keep), SEARCH_BLOCK_ROWS):
+                        f.write(np.ascontiguousarray(self._matrix[keep[i:i + SEARCH_BLOCK_ROWS]]).tobytes())
+                
+                # Copy live chunk records, rebuilding offsets and metadata
+                offsets, metadatas, rows_by_document = [], [], {}
+                with open(self._chunks_path, "rb") as src, open(tmp_chunks, "wb") as dst:
+                    offset = 0
+                    for row, line in enumerate(src):
+                        if self._deleted[row]:
+                            continue
+                        meta = self._metadatas[row]
+                        rows_by_document.setdefault(meta["document_id"], []).append(len(metadatas))
+                        metadatas.append(meta)
+                        offsets.append(offset)
+                        dst.write(line)
+                        offset += len(line)
+                
+                sq_norms = self._sq_norms[keep] if self.space == "l2" else np.zeros(0, dtype=np.float32)
+                
+                # Build the new FAISS index before taking the search lock
+                if len(keep):
+                    new_matrix = np.memmap(tmp_vectors, dtype=np.float32, mode="r", shape=(len(keep), self.dim))
+                else:
+                    new_matrix = np.zeros((0, self.dim), dtype=np.float32)
+                faiss_index = self._make_faiss_index(new_matrix)
+                del new_matrix
+                
+                with self._lock:
+                    # Release memory maps before replacing the files they map
+                    self._matrix = None
+                    self._faiss_index = None
+                    
+                    # A crash between the two replaces is finished by
+                    # _recover_compaction on the next start
+                    os.replace(tmp_vectors, self._vectors_path)
+                    os.replace(tmp_chunks, self._chunks_path)
+                    
+                    self._metadatas = metadatas
+                    self._offsets = offsets
+                    self._rows_by_document = rows_by_document
+                    self._deleted = np.zeros(len(metadatas), dtype=bool)
+                    self._deleted_documents = set()
+                    self._sq_norms = sq_norms
+                    self._open_matrix(len(metadatas))
+                    self._faiss_index = faiss_index
+                    self._faiss_params = None
+                
+                self._save_deleted()
+            
+            reclaimed = max(0, size_before - directory_size(self.index_dir))
+            print(f"Local index compacted, reclaimed {reclaimed / 1024 / 1024:.1f}MB")
+            return reclaimed
+        
+        except Exception as e:
+            print(f"Error compacting local index: {str(e)}")
+            raise
+        
+        finally:
+            self._compact_lock.release()
+    
+    def clear(self):
+        """Clear all documents from vector store"""
+        try:
+            with self._write_lock, self._lock:
+                # Drop the memory map before deleting the file it maps
+                self._matrix = None
+                self._faiss_index = None
+                
+                for path in (self._info_path, self._vectors_path, self._chunks_path, self._deleted_path):
+                    if path.exists():
+                        path.unlink()
+                
+                self.space = index_settings()["space"]
+                self._load()
+            
+            print("Local index cleared")
+        
+        except Exception as e:
+            print(f"Error clearing local index: {str(e)}")
+            raise
+    
+    def count_documents(self) -> int:
+        """Get count of documents in store"""
+        return len(self._metadatas) - int(self._deleted.sum())
+    
+    def is_initialized(self) -> bool:
+        """Check if vector store has documents"""
+        return self.count_documents() > 0
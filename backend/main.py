@@ -6,29 +6,243 @@ Description: FastAPI server with WebSocket support for real-time voice assistant
 
 import os
 import json
+import uuid
+import shutil
 import asyncio
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from pathlib import Path
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
 from agent import AIAgent
-from pdf_processor import PDFProcessor
-from vector_store import VectorStore
+from pdf_processor import PDFProcessor, preload, shutdown_ocr_pool
+from vector_store import create_vector_store, INGEST_BATCH_SIZE
 
 # Load environment variables
 load_dotenv()
 
+# Components are created by the lifespan handler, not at import time, so
+# importing this module (workers, tests) stays cheap
+pdf_processor: Optional[PDFProcessor] = None
+vector_store = None
+ai_agent: Optional[AIAgent] = None
+
+# Startup progress reported by /health
+startup_state = {
+    "status": "starting",
+    "embedding_model_ready": False,
+    "error": None
+}
+components_ready = asyncio.Event()
+
+# Seconds a request waits for startup before giving up with 503
+STARTUP_TIMEOUT = float(os.getenv("STARTUP_TIMEOUT", 60))
+
+# Bulk upload: worker processes for PDF extraction (created on first use)
+# and the read size used when streaming uploads and archive members to disk
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+STREAM_CHUNK_SIZE = 1024 * 1024
+extraction_pool: Optional[ProcessPoolExecutor] = None
+
+
+def build_components():
+    """Create the PDF processor, vector store and AI agent"""
+    processor = PDFProcessor()
+    store = create_vector_store()
+    agent = AIAgent(store)
+    return processor, store, agent
+
+
+async def initialize_components():
+    """
+    Build components off the event loop, then warm up the embedding model
+    
+    The server accepts connections (and answers /health) while this runs.
+    Requests that need the components wait until they exist; the embedding
+    warm-up keeps running in the background after that.
+    """
+    global pdf_processor, vector_store, ai_agent
+    
+    try:
+        pdf_processor, vector_store, ai_agent = await asyncio.to_thread(build_components)
+    except Exception as e:
+        print(f"Error during startup: {str(e)}")
+        startup_state["status"] = "error"
+        startup_state["error"] = str(e)
+        components_ready.set()
+        return
+    
+    startup_state["status"] = "warming_up"
+    components_ready.set()
+    
+    try:
+        await asyncio.to_thread(vector_store.warm_up)
+        startup_state["embedding_model_ready"] = True
+        startup_state["status"] = "healthy"
+    except Exception as e:
+        # Requests still work; the model loads on first use instead
+        print(f"Error warming up embedding model: {str(e)}")
+        startup_state["status"] = "degraded"
+        startup_state["error"] = str(e)
+
+
+async def wait_until_ready():
+    """Wait for startup to finish building components, or fail with 503"""
+    try:
+        await asyncio.wait_for(components_ready.wait(), timeout=STARTUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Server is still starting up")
+    
+    if ai_agent is None:
+        raise HTTPException(status_code=503, detail=f"Server failed to start: {startup_state['error']}")
+
+
+def get_extraction_pool() -> ProcessPoolExecutor:
+    """Return the PDF extraction pool, creating it on first use"""
+    global extraction_pool
+    
+    if extraction_pool is None:
+        # Spawned workers do not inherit the server's threads and open stores
+        extraction_pool = ProcessPoolExecutor(
+            max_workers=INGEST_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=preload
+        )
+    return extraction_pool
+
+
+def discard_extraction_pool(pool: ProcessPoolExecutor):
+    """Drop a pool broken by a crashed worker so the next upload gets a new one"""
+    global extraction_pool
+    
+    if extraction_pool is pool:
+        extraction_pool = None
+    pool.shutdown(wait=False)
+
+
+async def save_upload(file: UploadFile, destination: Path, max_size: int):
+    """
+    Stream an upload to disk without holding it in memory
+    
+    Raises:
+        ValueError: If the upload is larger than max_size (the partial file is removed)
+    """
+    size = 0
+    try:
+        with open(destination, "wb") as f:
+            while piece := await file.read(STREAM_CHUNK_SIZE):
+                size += len(piece)
+                if size > max_size:
+                    raise ValueError(f"File size exceeds {max_size/1024/1024}MB limit")
+                f.write(piece)
+    except Exception:
+        destination.unlink(missing_ok=True)
+        raise
+
+
+def unpack_archive(
+    archive_path: Path,
+    claim,
+    max_size: int,
+    max_members: int,
+    max_total_size: int
+) -> List[Tuple[str, Optional[Path], Optional[str]]]:
+    """
+    Stream the PDF members of a ZIP archive into the upload directory
+    
+    Args:
+        archive_path: Path of the saved archive
+        claim: Callable mapping a filename to its destination path, or None if taken
+        max_size: Maximum uncompressed size of a member
+        max_members: Maximum number of file members
+        max_total_size: Maximum uncompressed size of all file members together
+        
+    Returns:
+        (filename, saved path or None, error or None) for each file member
+        
+    Raises:
+        ValueError: If the archive exceeds max_members or max_total_size
+            (checked before anything is extracted)
+    """
+    members = []
+    with zipfile.ZipFile(archive_path) as archive:
+        entries = [
+            info for info in archive.infolist()
+            if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+        ]
+        
+        # Declared sizes are binding: zipfile stops reading a member at its
+        # file_size, so they bound what extraction can write to disk
+        if len(entries) > max_members:
+            raise ValueError(f"Archive has more than {max_members} files")
+        if sum(info.file_size for info in entries) > max_total_size:
+            raise ValueError(f"Archive expands to more than {max_total_size/1024/1024}MB")
+        
+        for info in entries:
+            # Members are flattened, so an archive cannot write outside UPLOAD_DIR
+            filename = Path(info.filename).name
+            if not filename.lower().endswith(".pdf"):
+                members.append((info.filename, None, "Only PDF files are allowed"))
+                continue
+            if info.file_size > max_size:
+                members.append((filename, None, f"File size exceeds {max_size/1024/1024}MB limit"))
+                continue
+            
+            # Flag bit 0 marks an encrypted member
+            if info.flag_bits & 0x1:
+                members.append((filename, None, "Encrypted files are not supported"))
+                continue
+            
+            destination = claim(filename)
+            if destination is None:
+                members.append((filename, None, "Duplicate filename in upload"))
+                continue
+            
+            # Unsupported compression and corrupt data fail only this member
+            try:
+                with archive.open(info) as src, open(destination, "wb") as dst:
+                    shutil.copyfileobj(src, dst, STREAM_CHUNK_SIZE)
+            except Exception as e:
+                destination.unlink(missing_ok=True)
+                members.append((filename, None, str(e)))
+                continue
+            members.append((filename, destination, None))
+    
+    return members
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start component initialization in the background"""
+    global components_ready
+    
+    # Created here so the event belongs to the server's event loop
+    components_ready = asyncio.Event()
+    startup_task = asyncio.create_task(initialize_components())
+    yield
+    startup_task.cancel()
+    
+    if extraction_pool is not None:
+        extraction_pool.shutdown(cancel_futures=True)
+    shutdown_ocr_pool()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="AI Voice Assistant API",
     description="Real-time voice assistant with PDF analysis capabilities by Umair Elahi",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -40,11 +254,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize components
-pdf_processor = PDFProcessor()
-vector_store = VectorStore()
-ai_agent = AIAgent(vector_store)
-
 # Create upload directory
 UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "./uploads"))
 UPLOAD_DIR.mkdir(exist_ok=True)
@@ -63,6 +272,7 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     conversation_id: Optional[str] = None
+    document_ids: Optional[List[str]] = None
 
 
 class ChatResponse(BaseModel):
@@ -73,12 +283,31 @@ class ChatResponse(BaseModel):
 
 class UploadResponse(BaseModel):
     success: bool
+    document_id: str
     filename: str
     pages: int
     chunks: int
     message: str
 
 
+class BulkUploadResult(BaseModel):
+    filename: str
+    success: bool
+    document_id: Optional[str] = None
+    pages: int = 0
+    chunks: int = 0
+    error: Optional[str] = None
+
+
+class BulkUploadResponse(BaseModel):
+    success: bool
+    files: int
+    succeeded: int
+    failed: int
+    chunks: int
+    results: List[BulkUploadResult]
+
+
 # Health check endpoint
 @app.get("/")
 async def root():
@@ -93,15 +322,18 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Detailed health check"""
+    """Detailed health check, including startup readiness"""
     return {
-        "status": "healthy",
+        "status": startup_state["status"],
+        "ready": ai_agent is not None,
         "timestamp": datetime.now().isoformat(),
         "components": {
-            "vector_store": vector_store.is_initialized(),
-            "ai_agent": True,
-            "pdf_processor": True
-        }
+            "vector_store": vector_store is not None and vector_store.is_initialized(),
+            "ai_agent": ai_agent is not None,
+            "pdf_processor": pdf_processor is not None,
+            "embedding_model": startup_state["embedding_model_ready"]
+        },
+        "error": startup_state["error"]
     }
 
 
@@ -110,6 +342,8 @@ async def upload_pdf(file: UploadFile = File(...)):
     """
     Upload and process a PDF file
     """
+    await wait_until_ready()
+    
     try:
         # Validate file
         if not file.filename.endswith('.pdf'):
@@ -126,25 +360,26 @@ async def upload_pdf(file: UploadFile = File(...)):
         with open(file_path, "wb") as f:
             f.write(contents)
         
-        # Process PDF
+        # Process PDF off the event loop; OCR of scanned pages can take a while
         print(f"Processing PDF: {file.filename}")
-        text_chunks = pdf_processor.process_pdf(str(file_path))
+        extracted = await asyncio.to_thread(pdf_processor.extract_document, str(file_path))
+        chunks = extracted["chunks"]
         
-        # Store in vector database
-        print(f"Storing {len(text_chunks)} chunks in vector database")
-        vector_store.add_documents(text_chunks, metadata={"filename": file.filename})
-        
-        # Get page count
-        import fitz  # PyMuPDF
-        doc = fitz.open(str(file_path))
-        page_count = len(doc)
-        doc.close()
+        # Store in vector database with page and section metadata
+        print(f"Storing {len(chunks)} chunks in vector database")
+        document_id = await asyncio.to_thread(
+            vector_store.add_documents,
+            [chunk["text"] for chunk in chunks],
+            metadata={"filename": file.filename},
+            metadatas=[{"page": chunk["page"], "section": chunk["section"]} for chunk in chunks]
+        )
         
         return UploadResponse(
             success=True,
+            document_id=document_id,
             filename=file.filename,
-            pages=page_count,
-            chunks=len(text_chunks),
+            pages=extracted["pages"],
+            chunks=len(chunks),
             message=f"Successfully processed {file.filename}"
         )
     
@@ -153,16 +388,159 @@ async def upload_pdf(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
 
 
+@app.post("/upload/bulk", response_model=BulkUploadResponse)
+async def upload_bulk(files: List[UploadFile] = File(...)):
+    """
+    Upload many PDFs, or ZIP archives of PDFs, in one request
+    
+    Files are streamed to disk, extracted in parallel worker processes and
+    their chunks inserted in large batches spanning several files. Every
+    file gets its own result; a bad file does not fail the others.
+    """
+    await wait_until_ready()
+    
+    try:
+        max_size = int(os.getenv("MAX_FILE_SIZE", 10485760))
+        max_archive_size = int(os.getenv("MAX_ARCHIVE_SIZE", 104857600))
+        max_archive_members = int(os.getenv("MAX_ARCHIVE_MEMBERS", 1000))
+        max_archive_total = int(os.getenv("MAX_ARCHIVE_UNCOMPRESSED_SIZE", 1073741824))
+        
+        results: List[BulkUploadResult] = []
+        saved: List[Tuple[int, Path]] = []
+        claimed = set()
+        
+        def claim(filename: str) -> Optional[Path]:
+            if filename in claimed:
+                return None
+            claimed.add(filename)
+            return UPLOAD_DIR / filename
+        
+        def record(filename: str, path: Optional[Path], error: Optional[str]):
+            results.append(BulkUploadResult(filename=filename, success=False, error=error))
+            if path is not None:
+                saved.append((len(results) - 1, path))
+        
+        # 1. Stream every PDF, and every PDF inside an archive, to disk
+        for file in files:
+            filename = Path(file.filename or "").name
+            
+            if filename.lower().endswith(".zip"):
+                archive_path = UPLOAD_DIR / f".{uuid.uuid4().hex}.zip"
+                try:
+                    await save_upload(file, archive_path, max_archive_size)
+                    members = await asyncio.to_thread(
+                        unpack_archive, archive_path, claim, max_size, max_archive_members, max_archive_total
+                    )
+                    for member in members:
+                        record(*member)
+                except (ValueError, zipfile.BadZipFile) as e:
+                    record(filename, None, str(e))
+                finally:
+                    archive_path.unlink(missing_ok=True)
+                continue
+            
+            if not filename.lower().endswith(".pdf"):
+                record(filename, None, "Only PDF and ZIP files are allowed")
+                continue
+            
+            destination = claim(filename)
+            if destination is None:
+                record(filename, None, "Duplicate filename in upload")
+                continue
+            
+            try:
+                await save_upload(file, destination, max_size)
+                record(filename, destination, None)
+            except ValueError as e:
+                record(filename, None, str(e))
+        
+        print(f"Bulk upload: extracting {len(saved)} PDFs with {INGEST_WORKERS} workers")
+        
+        # 2. Extract in parallel and insert chunks in batches across files
+        loop = asyncio.get_running_loop()
+        pool = get_extraction_pool()
+        
+        async def extract(index: int, path: Path):
+            try:
+                return index, await loop.run_in_executor(pool, pdf_processor.extract_document, str(path)), None
+            except BrokenProcessPool:
+                # A crash (e.g. on a malformed PDF) fails every file in the pool
+                discard_extraction_pool(pool)
+                return index, None, "PDF extraction worker crashed"
+            except Exception as e:
+                return index, None, str(e)
+        
+        async def store(batch: List[Tuple[int, Dict]]):
+            documents = [
+                {
+                    "texts": [chunk["text"] for chunk in extracted["chunks"]],
+                    "metadata": {"filename": results[index].filename},
+                    "metadatas": [{"page": chunk["page"], "section": chunk["section"]} for chunk in extracted["chunks"]]
+                }
+                for index, extracted in batch
+            ]
+            
+            # A failed batch is rolled back by the store, so every file in it failed
+            try:
+                document_ids = await asyncio.to_thread(vector_store.add_document_batch, documents)
+            except Exception as e:
+                print(f"Error storing bulk upload batch: {str(e)}")
+                for index, _ in batch:
+                    results[index].error = f"Error storing chunks: {str(e)}"
+                return
+            
+            for (index, extracted), document_id in zip(batch, document_ids):
+                result = results[index]
+                result.success = True
+                result.document_id = document_id
+                result.pages = extracted["pages"]
+                result.chunks = len(extracted["chunks"])
+        
+        batch: List[Tuple[int, Dict]] = []
+        batch_chunks = 0
+        for next_done in asyncio.as_completed([extract(index, path) for index, path in saved]):
+            index, extracted, error = await next_done
+            if error is not None:
+                results[index].error = error
+                continue
+            
+            batch.append((index, extracted))
+            batch_chunks += len(extracted["chunks"])
+            if batch_chunks >= INGEST_BATCH_SIZE:
+                await store(batch)
+                batch, batch_chunks = [], 0
+        
+        if batch:
+            await store(batch)
+        
+        succeeded = sum(result.success for result in results)
+        return BulkUploadResponse(
+            success=succeeded == len(results) and len(results) > 0,
+            files=len(results),
+            succeeded=succeeded,
+            failed=len(results) - succeeded,
+            chunks=sum(result.chunks for result in results),
+            results=results
+        )
+    
+    except Exception as e:
+        print(f"Error in bulk upload: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing upload: {str(e)}")
+
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
     Process a chat message and return AI response
     """
+    await wait_until_ready()
+    
     try:
         # Generate response
         response = await ai_agent.generate_response(
             message=request.message,
-            conversation_id=request.conversation_id
+            conversation_id=request.conversation_id,
+            document_ids=request.document_ids
         )
         
         return ChatResponse(
@@ -203,6 +581,18 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
                 # Process voice input
                 transcript = data.get("transcript", "")
                 conversation_id = data.get("conversation_id")
+                document_ids = data.get("document_ids")
+                
+                # Same shape ChatRequest enforces for /chat; a bare string would
+                # otherwise be filtered character by character
+                if document_ids is not None and not (
+                    isinstance(document_ids, list) and all(isinstance(d, str) for d in document_ids)
+                ):
+                    await websocket.send_json({
+                        "type": "error",
+                        "message": "Error: document_ids must be a list of strings"
+                    })
+                    continue
                 
                 print(f"Received voice input from {client_id}: {transcript}")
                 
@@ -213,10 +603,13 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
                 })
                 
                 try:
+                    await wait_until_ready()
+                    
                     # Generate AI response
                     response = await ai_agent.generate_response(
                         message=transcript,
-                        conversation_id=conversation_id
+                        conversation_id=conversation_id,
+                        document_ids=document_ids
                     )
                     
                     # Send response
@@ -262,11 +655,49 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
             pass
 
 
+def compact_vector_store():
+    """Reclaim disk space left by deleted documents (runs in the background)"""
+    try:
+        vector_store.compact()
+    except Exception as e:
+        print(f"Background compaction failed: {str(e)}")
+
+
+@app.delete("/documents/{document_id}")
+async def delete_document(document_id: str, background_tasks: BackgroundTasks):
+    """
+    Delete one document's chunks from vector store
+    """
+    await wait_until_ready()
+    
+    try:
+        # Runs off the event loop so queries keep being served during large deletes
+        deleted = await asyncio.to_thread(vector_store.delete_document, document_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting document: {str(e)}")
+    
+    if deleted == 0:
+        raise HTTPException(status_code=404, detail=f"Document {document_id} not found")
+    
+    compaction_scheduled = vector_store.needs_compaction()
+    if compaction_scheduled:
+        background_tasks.add_task(compact_vector_store)
+    
+    return {
+        "success": True,
+        "document_id": document_id,
+        "chunks_deleted": deleted,
+        "compaction_scheduled": compaction_scheduled
+    }
+
+
 @app.delete("/clear")
 async def clear_vector_store():
     """
     Clear all documents from vector store
     """
+    await wait_until_ready()
+    
     try:
         vector_store.clear()
         return {"success": True, "message": "Vector store cleared"}
@@ -281,7 +712,7 @@ async def get_stats():
     """
     return {
         "active_connections": len(active_connections),
-        "documents_count": vector_store.count_documents(),
+        "documents_count": vector_store.count_documents() if vector_store else 0,
         "timestamp": datetime.now().isoformat()
     }
 
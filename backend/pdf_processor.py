@@ -5,10 +5,119 @@ Description: Processes PDF files and extracts text for analysis
 """
 
 import os
-from typing import List
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Optional, Tuple
 from pathlib import Path
 
-import fitz  # PyMuPDF
+# Part of every OCR cache key; bump when OCR output changes so old entries are ignored
+OCR_CACHE_VERSION = 1
+
+# Blocks wider than this share of the page span columns (titles, full-width text)
+WIDE_BLOCK_RATIO = 0.55
+
+# Extraction worker processes (bulk upload) already run files in parallel,
+# so OCR runs inline there instead of starting a nested pool
+_in_extraction_worker = False
+_ocr_pool: Optional[ProcessPoolExecutor] = None
+
+
+def preload():
+    """Prepare an extraction worker process (process pool initializer)"""
+    global _in_extraction_worker
+    
+    import fitz  # noqa: F401
+    _in_extraction_worker = True
+
+
+def order_blocks(blocks: List[Tuple], page_width: float) -> List[str]:
+    """
+    Put a page's text blocks in reading order
+    
+    Wide blocks are read top to bottom. The narrower blocks between two wide
+    ones are grouped into columns by horizontal overlap and read one column
+    at a time, left to right, so multi-column text is not interleaved.
+    
+    Args:
+        blocks: PyMuPDF "blocks" tuples (x0, y0, x1, y1, text, block_no, block_type)
+        page_width: Page width in points
+        
+    Returns:
+        Block texts in reading order
+    """
+    ordered = []
+    segment = []
+    
+    def flush():
+        columns = []
+        for block in sorted(segment, key=lambda b: b[0]):
+            # A block starting left of the current column's right edge belongs to it
+            if columns and block[0] < columns[-1][0]:
+                columns[-1][0] = max(columns[-1][0], block[2])
+                columns[-1][1].append(block)
+            else:
+                columns.append([block[2], [block]])
+        
+        for _right, column in columns:
+            ordered.extend(block[4] for block in sorted(column, key=lambda b: b[1]))
+        segment.clear()
+    
+    # Block type 0 is text, 1 is an image
+    text_blocks = [b for b in blocks if b[6] == 0 and b[4].strip()]
+    for block in sorted(text_blocks, key=lambda b: (b[1], b[0])):
+        if block[2] - block[0] > page_width * WIDE_BLOCK_RATIO:
+            flush()
+            ordered.append(block[4])
+        else:
+            segment.append(block)
+    flush()
+    
+    return ordered
+
+
+def ocr_page(file_path: str, page_num: int, language: str, dpi: int) -> str:
+    """
+    OCR one page with Tesseract (through PyMuPDF)
+    
+    Module-level so it can run in a worker process.
+    
+    Returns:
+        Page text in reading order
+    """
+    import fitz  # PyMuPDF
+    
+    doc = fitz.open(file_path)
+    try:
+        page = doc[page_num]
+        textpage = page.get_textpage_ocr(language=language, dpi=dpi, full=True)
+        blocks = page.get_text("blocks", textpage=textpage)
+        return "\n".join(order_blocks(blocks, page.rect.width))
+    finally:
+        doc.close()
+
+
+def get_ocr_pool(workers: int) -> ProcessPoolExecutor:
+    """Return the OCR process pool, creating it on first use"""
+    global _ocr_pool
+    
+    if _ocr_pool is None:
+        _ocr_pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=preload
+        )
+    return _ocr_pool
+
+
+def shutdown_ocr_pool():
+    """Stop the OCR worker processes, if any were started"""
+    global _ocr_pool
+    
+    if _ocr_pool is not None:
+        _ocr_pool.shutdown(cancel_futures=True)
+        _ocr_pool = None
 
 
 class PDFProcessor:
@@ -17,7 +126,15 @@ class PDFProcessor:
     def __init__(self):
         self.chunk_size = int(os.getenv("CHUNK_SIZE", 1000))
         self.chunk_overlap = int(os.getenv("CHUNK_OVERLAP", 200))
-        print(f"PDF Processor initialized (chunk_size={self.chunk_size}, overlap={self.chunk_overlap})")
+        
+        # OCR for pages without a text layer; results are cached by page hash
+        self.ocr_enabled = os.getenv("OCR_ENABLED", "true").lower() == "true"
+        self.ocr_language = os.getenv("OCR_LANGUAGE", "eng")
+        self.ocr_dpi = int(os.getenv("OCR_DPI", 300))
+        self.ocr_workers = int(os.getenv("OCR_WORKERS", os.cpu_count() or 1))
+        self.cache_dir = Path(os.getenv("EXTRACTION_CACHE_DIR", "./extraction_cache"))
+        
+        print(f"PDF Processor initialized (chunk_size={self.chunk_size}, overlap={self.chunk_overlap}, ocr={self.ocr_enabled})")
     
     def process_pdf(self, file_path: str) -> List[str]:
         """
@@ -29,29 +146,202 @@ class PDFProcessor:
         Returns:
             List of text chunks
         """
+        return [chunk["text"] for chunk in self.process_pdf_chunks(file_path)]
+    
+    def process_pdf_chunks(self, file_path: str) -> List[Dict]:
+        """
+        Extract text from PDF and split into chunks with page and section info
+        
+        Each page is read with its own strategy: pages with a text layer use
+        their text blocks in layout order (columns are not interleaved), and
+        pages without one that carry images are OCRed. Chunks never span
+        pages, so each one can be filtered by page number. The section is
+        taken from the PDF outline (table of contents) when the document has
+        one.
+        
+        Args:
+            file_path: Path to PDF file
+            
+        Returns:
+            List of dicts with "text", "page" (1-based) and "section"
+        """
+        import fitz  # PyMuPDF, imported on first use to keep startup fast
+        
         try:
             # Open PDF
             doc = fitz.open(file_path)
             
-            # Extract text from all pages
-            full_text = ""
+            sections = self._page_sections(doc)
+            
+            # Read text layers; collect scanned pages for OCR
+            page_texts = []
+            scanned = []
             for page_num in range(len(doc)):
                 page = doc[page_num]
-                text = page.get_text()
-                full_text += f"\n\n--- Page {page_num + 1} ---\n\n{text}"
+                text = "\n".join(order_blocks(page.get_text("blocks"), page.rect.width))
+                if not text.strip() and self.ocr_enabled and page.get_images():
+                    scanned.append(page_num)
+                page_texts.append(text)
             
-            doc.close()
+            for page_num, text in self._ocr_pages(doc, file_path, scanned).items():
+                page_texts[page_num] = text
             
-            # Split into chunks
-            chunks = self._split_text(full_text)
+            # Split text page by page
+            chunks = []
+            for page_num, text in enumerate(page_texts):
+                for chunk in self._split_text(text):
+                    chunks.append({
+                        "text": chunk,
+                        "page": page_num + 1,
+                        "section": sections[page_num]
+                    })
             
-            print(f"Extracted {len(chunks)} chunks from PDF")
+            doc.close()
+            
+            print(f"Extracted {len(chunks)} chunks from PDF ({len(scanned)} scanned pages)")
             return chunks
         
         except Exception as e:
             print(f"Error processing PDF: {str(e)}")
             raise
     
+    def _ocr_pages(self, doc, file_path: str, page_nums: List[int]) -> Dict[int, str]:
+        """
+        OCR pages, reusing cached results
+        
+        The cache is keyed by page content, not by file or chunk settings, so
+        re-uploading a document or changing CHUNK_SIZE does not redo OCR.
+        Uncached pages run in a process pool, or inline when already inside
+        an extraction worker.
+        
+        Args:
+            doc: Open PyMuPDF document
+            file_path: Path to the same PDF (opened again by workers)
+            page_nums: 0-based pages to OCR
+            
+        Returns:
+            Text per page number (empty for pages where OCR failed)
+        """
+        global _ocr_pool
+        
+        texts = {}
+        missing = {}
+        for page_num in page_nums:
+            key = self._page_key(doc, doc[page_num])
+            cached = self._read_cache(key)
+            if cached is None:
+                missing[page_num] = key
+            else:
+                texts[page_num] = cached
+        
+        futures = {}
+        if len(missing) > 1 and self.ocr_workers > 1 and not _in_extraction_worker:
+            pool = get_ocr_pool(self.ocr_workers)
+            futures = {
+                page_num: pool.submit(ocr_page, file_path, page_num, self.ocr_language, self.ocr_dpi)
+                for page_num in missing
+            }
+        
+        errors = []
+        for page_num, key in missing.items():
+            try:
+                if page_num in futures:
+                    text = futures[page_num].result()
+                else:
+                    text = ocr_page(file_path, page_num, self.ocr_language, self.ocr_dpi)
+            except BrokenProcessPool as e:
+                # A crashed worker breaks the pool; start a new one next time
+                _ocr_pool = None
+                errors.append(e)
+                texts[page_num] = ""
+                continue
+            except Exception as e:
+                # Usually Tesseract missing or TESSDATA_PREFIX unset; not cached, so retried later
+                errors.append(e)
+                texts[page_num] = ""
+                continue
+            
+            self._write_cache(key, text)
+            texts[page_num] = text
+        
+        if errors:
+            print(f"OCR failed on {len(errors)} of {len(page_nums)} pages: {str(errors[0])}")
+        
+        return texts
+    
+    def _page_key(self, doc, page) -> str:
+        """
+        Hash everything an OCR result depends on
+        
+        Scanned pages often share the same drawing commands, so the page's
+        image data is hashed along with them.
+        """
+        digest = hashlib.sha256(
+            f"{OCR_CACHE_VERSION}|{self.ocr_language}|{self.ocr_dpi}|{tuple(page.rect)}|{page.rotation}".encode()
+        )
+        digest.update(page.read_contents())
+        for image in page.get_images(full=True):
+            digest.update(doc.xref_stream_raw(image[0]) or b"")
+        return digest.hexdigest()
+    
+    def _cache_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.txt"
+    
+    def _read_cache(self, key: str) -> Optional[str]:
+        """Cached OCR text for a page key, or None"""
+        try:
+            return self._cache_path(key).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+    
+    def _write_cache(self, key: str, text: str):
+        """Store OCR text; written to a temp file and renamed so readers never see a partial entry"""
+        path = self._cache_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(text, encoding="utf-8")
+        os.replace(tmp_path, path)
+    
+    def extract_document(self, file_path: str) -> Dict:
+        """
+        Extract chunks and page count in one call (used by worker processes)
+        
+        Args:
+            file_path: Path to PDF file
+            
+        Returns:
+            Dict with "chunks" (as from process_pdf_chunks) and "pages"
+        """
+        return {
+            "chunks": self.process_pdf_chunks(file_path),
+            "pages": self.count_pages(file_path)
+        }
+    
+    def _page_sections(self, doc) -> List[str]:
+        """
+        Map each page to the title of the outline entry it falls under
+        
+        Args:
+            doc: Open PyMuPDF document
+            
+        Returns:
+            Section title per page (empty string when unknown)
+        """
+        # TOC entries are [level, title, page] in reading order; the last
+        # entry starting on a page is the one that carries over to later pages
+        starts = {}
+        for _level, title, page in doc.get_toc():
+            if 1 <= page <= len(doc):
+                starts[page - 1] = title.strip()
+        
+        sections = []
+        current = ""
+        for page_num in range(len(doc)):
+            current = starts.get(page_num, current)
+            sections.append(current)
+        
+        return sections
+    
     def _split_text(self, text: str) -> List[str]:
         """
         Split text into overlapping chunks
@@ -99,6 +389,24 @@ class PDFProcessor:
         
         return chunks
     
+    def count_pages(self, file_path: str) -> int:
+        """
+        Get the number of pages in a PDF
+        
+        Args:
+            file_path: Path to PDF file
+            
+        Returns:
+            Page count
+        """
+        import fitz  # PyMuPDF
+        
+        doc = fitz.open(file_path)
+        try:
+            return len(doc)
+        finally:
+            doc.close()
+    
     def extract_metadata(self, file_path: str) -> dict:
         """
         Extract metadata from PDF
@@ -109,6 +417,8 @@ class PDFProcessor:
         Returns:
             Dictionary of metadata
         """
+        import fitz  # PyMuPDF
+        
         try:
             doc = fitz.open(file_path)
             metadata = doc.metadata
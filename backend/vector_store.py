@@ -5,21 +5,121 @@ Description: Manages document embeddings and semantic search using ChromaDB
 """
 
 import os
-from typing import List, Dict, Optional
+import json
+import uuid
+import sqlite3
+import threading
+from typing import List, Dict, Optional, Tuple
 from pathlib import Path
 
-import chromadb
-from chromadb.config import Settings
 import httpx
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Chunks removed per delete call, so long deletes interleave with queries
+DELETE_BATCH_SIZE = int(os.getenv("DELETE_BATCH_SIZE", 500))
+
+# Chunks embedded and inserted per call when several documents are added together
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 1000))
+
+
+def flatten_documents(documents: List[Dict]) -> Tuple[List[str], List[str], List[str], List[Dict]]:
+    """
+    Flatten documents into parallel chunk lists for batched inserts
+    
+    Args:
+        documents: Dicts with "texts" and optional "metadata", "metadatas"
+            and "document_id" (the add_documents arguments)
+        
+    Returns:
+        Document IDs (generated when missing), chunk IDs, chunk texts and
+        chunk metadata with the document ID merged in
+    """
+    document_ids, ids, texts, chunk_metadatas = [], [], [], []
+    for document in documents:
+        document_id = document.get("document_id") or uuid.uuid4().hex
+        document_ids.append(document_id)
+        
+        metadata = document.get("metadata") or {}
+        metadatas = document.get("metadatas")
+        for i, text in enumerate(document["texts"]):
+            # Chunk IDs are unique per source document
+            ids.append(f"{document_id}_{i}")
+            texts.append(text)
+            chunk_metadatas.append({
+                **metadata,
+                **(metadatas[i] if metadatas else {}),
+                "document_id": document_id
+            })
+    
+    return document_ids, ids, texts, chunk_metadatas
+
+
+def compaction_due(deleted: int, live: int) -> bool:
+    """
+    Decide whether enough chunks were deleted to make compaction worthwhile
+    
+    Args:
+        deleted: Chunks deleted since the last compaction
+        live: Chunks still in the store
+    """
+    min_deleted = int(os.getenv("COMPACTION_MIN_DELETED", 1000))
+    min_ratio = float(os.getenv("COMPACTION_MIN_RATIO", 0.2))
+    return deleted >= min_deleted and deleted >= min_ratio * (deleted + live)
+
+
+def directory_size(path: Path) -> int:
+    """Total size in bytes of all files under a directory"""
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def index_settings() -> Dict:
+    """
+    Read ANN index settings from the environment
+    
+    Defaults match ChromaDB's own HNSW defaults, so leaving them unset keeps
+    the previous behaviour.
+    """
+    return {
+        "space": os.getenv("VECTOR_SPACE", "l2"),
+        "construction_ef": int(os.getenv("HNSW_CONSTRUCTION_EF", 100)),
+        "search_ef": int(os.getenv("HNSW_SEARCH_EF", 10)),
+        "M": int(os.getenv("HNSW_M", 16)),
+    }
+
+
+def create_vector_store(embedding_function=None):
+    """
+    Create the vector store selected by VECTOR_BACKEND
+    
+    Args:
+        embedding_function: Optional ChromaDB-compatible embedding function
+        
+    Returns:
+        VectorStore ("chroma", default) or LocalIndexStore ("numpy" / "faiss")
+    """
+    backend = os.getenv("VECTOR_BACKEND", "chroma").lower()
+    
+    if backend == "chroma":
+        return VectorStore(embedding_function=embedding_function)
+    
+    if backend in ("numpy", "faiss"):
+        from local_index import LocalIndexStore
+        return LocalIndexStore(engine=backend, embedding_function=embedding_function)
+    
+    raise ValueError(f"Unknown VECTOR_BACKEND: {backend}")
+
 
 class VectorStore:
     """Manages document embeddings and semantic search"""
     
-    def __init__(self):
+    def __init__(self, embedding_function=None):
+        # ChromaDB pulls in its embedding stack, so it is imported only when a store is created
+        import chromadb
+        from chromadb.config import Settings
+        from chromadb.utils import embedding_functions
+        
         self.chroma_dir = Path(os.getenv("CHROMA_DIR", "./chroma_db"))
         self.chroma_dir.mkdir(exist_ok=True)
         
@@ -29,17 +129,30 @@ class VectorStore:
             settings=Settings(anonymized_telemetry=False)
         )
         
+        # Fall back to ChromaDB's default embedding function
+        self.embedding_function = embedding_function or embedding_functions.DefaultEmbeddingFunction()
+        
         # Get or create collection
-        self.collection = self.client.get_or_create_collection(
-            name="documents",
-            metadata={"description": "PDF document chunks"}
-        )
+        self._recover_compaction()
+        self.collection = self._get_collection()
+        
+        # Writers (add, delete, compact) are serialized; queries never take this lock
+        self._write_lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        
+        # Deleted chunks still take space until compaction; the count is kept
+        # on disk so restarts do not postpone it
+        self._deleted_count_path = self.chroma_dir / "deleted_count.json"
+        self._deleted_since_compaction = 0
+        if self._deleted_count_path.exists():
+            self._deleted_since_compaction = json.loads(self._deleted_count_path.read_text())
         
         # OpenRouter settings for embeddings
         self.api_key = os.getenv("OPENROUTER_API_KEY")
         self.embedding_url = "https://openrouter.ai/api/v1/embeddings"
         
-        self._initialized = False
+        # Documents persisted by a previous run are searchable right away
+        self._initialized = self.collection.count() > 0
         print("Vector store initialized")
     
     async def _get_embedding(self, text: str) -> List[float]:
@@ -106,41 +219,104 @@ class VectorStore:
         
         return embedding
     
-    def add_documents(self, texts: List[str], metadata: Optional[Dict] = None):
+    def add_documents(
+        self,
+        texts: List[str],
+        metadata: Optional[Dict] = None,
+        metadatas: Optional[List[Dict]] = None,
+        document_id: Optional[str] = None
+    ) -> str:
         """
         Add documents to vector store
         
         Args:
             texts: List of text chunks
-            metadata: Optional metadata for documents
+            metadata: Optional metadata shared by all chunks
+            metadatas: Optional per-chunk metadata (e.g. page, section)
+            document_id: Optional ID of the source document (generated if omitted)
+            
+        Returns:
+            Document ID the chunks were stored under
+        """
+        return self.add_document_batch([{
+            "texts": texts,
+            "metadata": metadata,
+            "metadatas": metadatas,
+            "document_id": document_id
+        }])[0]
+    
+    def add_document_batch(self, documents: List[Dict]) -> List[str]:
+        """
+        Add several documents, inserting their chunks together
+        
+        Chunks from all documents are written in slices of INGEST_BATCH_SIZE,
+        so many small files cost a few large embed/insert calls instead of
+        one each.
+        If a slice fails, the documents' chunks already written are deleted
+        before the error is raised.
+        
+        Args:
+            documents: Dicts with "texts" and optional "metadata", "metadatas"
+                and "document_id", as for add_documents
+            
+        Returns:
+            Document ID of each document, in order
         """
+        document_ids: List[str] = []
+        written = False
         try:
-            # Prepare documents
-            ids = [f"doc_{i}" for i in range(len(texts))]
-            metadatas = [metadata or {} for _ in texts]
+            document_ids, ids, texts, metadatas = flatten_documents(documents)
+            batch_size = min(INGEST_BATCH_SIZE, self.client.max_batch_size)
             
             # For simplicity, we'll use ChromaDB's default embedding function
             # In production, you might want to use custom embeddings
-            self.collection.add(
-                documents=texts,
-                metadatas=metadatas,
-                ids=ids
-            )
+            for start in range(0, len(texts), batch_size):
+                end = start + batch_size
+                with self._write_lock:
+                    self.collection.add(
+                        documents=texts[start:end],
+                        metadatas=metadatas[start:end],
+                        ids=ids[start:end]
+                    )
+                written = True
             
-            self._initialized = True
-            print(f"Added {len(texts)} documents to vector store")
+            if texts:
+                self._initialized = True
+                print(f"Added {len(texts)} documents to vector store")
+            return document_ids
         
         except Exception as e:
             print(f"Error adding documents: {str(e)}")
+            # Remove slices written before the failure so no chunks are left
+            # under document IDs the caller never received
+            if written:
+                for document_id in document_ids:
+                    try:
+                        self.delete_document(document_id)
+                    except Exception:
+                        pass
             raise
     
-    def search(self, query: str, k: int = 3) -> List[str]:
+    def search(
+        self,
+        query: str,
+        k: int = 3,
+        document_ids: Optional[List[str]] = None,
+        filename: Optional[str] = None,
+        page_range: Optional[Tuple[int, int]] = None
+    ) -> List[str]:
         """
         Search for relevant documents
         
+        Filters are pushed down to ChromaDB as a where clause, so only
+        matching chunks are considered.
+        
         Args:
             query: Search query
             k: Number of results to return
+            document_ids: Only search chunks from these documents
+            filename: Only search chunks from this file
+            page_range: Only search chunks from pages in (first, last), inclusive
             
         Returns:
             List of relevant document texts
@@ -149,9 +325,12 @@ class VectorStore:
             if not self._initialized or self.collection.count() == 0:
                 return []
             
+            where = self._build_where(document_ids, filename, page_range)
+            
             results = self.collection.query(
                 query_texts=[query],
-                n_results=min(k, self.collection.count())
+                n_results=min(k, self.collection.count()),
+                where=where
             )
             
             if results and results["documents"]:
@@ -163,17 +342,200 @@ class VectorStore:
             print(f"Error searching documents: {str(e)}")
             return []
     
+    def _build_where(
+        self,
+        document_ids: Optional[List[str]] = None,
+        filename: Optional[str] = None,
+        page_range: Optional[Tuple[int, int]] = None
+    ) -> Optional[Dict]:
+        """Build a ChromaDB where clause from search filters"""
+        conditions = []
+        
+        if document_ids:
+            conditions.append({"document_id": {"$in": list(document_ids)}})
+        
+        if filename:
+            conditions.append({"filename": filename})
+        
+        if page_range:
+            first, last = page_range
+            conditions.append({"page": {"$gte": first}})
+            conditions.append({"page": {"$lte": last}})
+        
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"$and": conditions}
+    
+    def delete_document(self, document_id: str) -> int:
+        """
+        Delete all chunks of one document
+        
+        Chunks are removed in batches of DELETE_BATCH_SIZE so queries can
+        run between batches. Disk space is reclaimed later by compact().
+        
+        Args:
+            document_id: ID returned by add_documents
+            
+        Returns:
+            Number of chunks deleted (0 if the document was not found)
+        """
+        try:
+            with self._write_lock:
+                ids = self.collection.get(
+                    where={"document_id": document_id},
+                    include=[]
+                )["ids"]
+                
+                for i in range(0, len(ids), DELETE_BATCH_SIZE):
+                    self.collection.delete(ids=ids[i:i + DELETE_BATCH_SIZE])
+                
+                if ids:
+                    self._deleted_since_compaction += len(ids)
+                    self._save_deleted_count()
+            
+            print(f"Deleted {len(ids)} chunks of document {document_id}")
+            return len(ids)
+        
+        except Exception as e:
+            print(f"Error deleting document: {str(e)}")
+            raise
+    
+    def _save_deleted_count(self):
+        """Persist the number of chunks deleted since the last compaction atomically"""
+        tmp_path = self._deleted_count_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self._deleted_since_compaction))
+        os.replace(tmp_path, self._deleted_count_path)
+    
+    def warm_up(self):
+        """
+        Load the embedding model
+        
+        The default model is downloaded and loaded on first use, which would
+        otherwise delay the first upload or query.
+        """
+        self.embedding_function(input=["warm up"])
+        print("Vector store warmed up")
+    
+    def needs_compaction(self) -> bool:
+        """Check if enough chunks were deleted to make compaction worthwhile"""
+        return compaction_due(self._deleted_since_compaction, self.count_documents())
+    
+    def compact(self) -> int:
+        """
+        Rebuild the collection without deleted chunks and reclaim disk space
+        
+        Live chunks are copied into a fresh collection which then replaces
+        the old one, dropping the HNSW index files that still hold deleted
+        entries. The SQLite database is vacuumed afterwards. Queries keep
+        using the old collection until the swap; writers wait for the copy.
+        
+        Returns:
+            Bytes reclaimed in CHROMA_DIR (0 if a compaction was already running)
+        """
+        if not self._compact_lock.acquire(blocking=False):
+            return 0
+        
+        try:
+            size_before = directory_size(self.chroma_dir)
+            
+            with self._write_lock:
+                # Drop leftovers from an interrupted compaction
+                try:
+                    self.client.delete_collection(name="documents_compacting")
+                except ValueError:
+                    pass
+                
+                # The copy keeps the settings the collection was built with
+                compacted = self._get_collection(name="documents_compacting", metadata=self.collection.metadata)
+                batch_size = self.client.max_batch_size
+                
+                total = self.collection.count()
+                for offset in range(0, total, batch_size):
+                    batch = self.collection.get(
+                        limit=batch_size,
+                        offset=offset,
+                        include=["embeddings", "documents", "metadatas"]
+                    )
+                    compacted.add(
+                        ids=batch["ids"],
+                        embeddings=batch["embeddings"],
+                        documents=batch["documents"],
+                        metadatas=batch["metadatas"]
+                    )
+                
+                # Rename the old collection aside before the copy takes its name, so
+                # a "documents" collection always exists if the process dies here
+                # (see _recover_compaction); queries move over before it is dropped
+                old = self.collection
+                old.modify(name="documents_old")
+                compacted.modify(name="documents")
+                self.collection = compacted
+                self.client.delete_collection(name="documents_old")
+                
+                self._deleted_since_compaction = 0
+                self._save_deleted_count()
+            
+            self._vacuum()
+            
+            reclaimed = max(0, size_before - directory_size(self.chroma_dir))
+            print(f"Vector store compacted, reclaimed {reclaimed / 1024 / 1024:.1f}MB")
+            return reclaimed
+        
+        except Exception as e:
+            print(f"Error compacting vector store: {str(e)}")
+            raise
+        
+        finally:
+            self._compact_lock.release()
+    
+    def _recover_compaction(self):
+        """
+        Finish a compaction that was interrupted during the collection swap
+        
+        If only the renamed old collection is left, it becomes "documents"
+        again; if both exist, the swap completed and the old one is dropped.
+        A half-built "documents_compacting" is cleaned up by the next compact().
+        """
+        names = {collection.name for collection in self.client.list_collections()}
+        if "documents_old" not in names:
+            return
+        
+        if "documents" in names:
+            self.client.delete_collection(name="documents_old")
+        else:
+            self.client.get_collection(name="documents_old").modify(name="documents")
+            print("Recovered documents collection from an interrupted compaction")
+    
+    def _vacuum(self):
+        """Shrink ChromaDB's SQLite file after large deletes"""
+        db_path = self.chroma_dir / "chroma.sqlite3"
+        if not db_path.exists():
+            return
+        
+        try:
+            conn = sqlite3.connect(str(db_path), timeout=30)
+            try:
+                conn.execute("VACUUM")
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            # ChromaDB may be holding a write transaction; try again next time
+            print(f"Skipping SQLite vacuum: {str(e)}")
+    
     def clear(self):
         """Clear all documents from vector store"""
         try:
-            # Delete collection
-            self.client.delete_collection(name="documents")
-            
-            # Recreate collection
-            self.collection = self.client.get_or_create_collection(
-                name="documents",
-                metadata={"description": "PDF document chunks"}
-            )
+            with self._write_lock:
+                # Delete collection
+                self.client.delete_collection(name="documents")
+                
+                # Recreate collection
+                self.collection = self._get_collection()
+                
+                self._deleted_since_compaction = 0
+                self._save_deleted_count()
             
             self._initialized = False
             print("Vector store cleared")
@@ -182,6 +544,44 @@ class VectorStore:
             print(f"Error clearing vector store: {str(e)}")
             raise
     
+    def _get_collection(self, name: str = "documents", metadata: Optional[Dict] = None):
+        """
+        Get or create a documents collection
+        
+        HNSW settings only take effect when the collection is created;
+        an existing collection keeps the settings it was built with.
+        
+        Args:
+            name: Collection name
+            metadata: Collection metadata to create with (defaults to the
+                current HNSW settings)
+        """
+        settings = index_settings()
+        configured = {
+            "hnsw:space": settings["space"],
+            "hnsw:construction_ef": settings["construction_ef"],
+            "hnsw:search_ef": settings["search_ef"],
+            "hnsw:M": settings["M"]
+        }
+        
+        try:
+            # get_or_create_collection would overwrite the stored metadata
+            # without rebuilding the index, so existing collections are only read
+            collection = self.client.get_collection(name=name, embedding_function=self.embedding_function)
+        except ValueError:
+            return self.client.create_collection(
+                name=name,
+                metadata=metadata or {"description": "PDF document chunks", **configured},
+                embedding_function=self.embedding_function
+            )
+        
+        built = collection.metadata or {}
+        for key, value in configured.items():
+            if key in built and built[key] != value:
+                print(f"Collection {name} was built with {key}={built[key]}, ignoring configured {value}")
+        
+        return collection
+    
     def count_documents(self) -> int:
         """Get count of documents in store"""
         try:
@@ -29,12 +29,31 @@ export interface VoiceState {
 
 export interface UploadResult {
   success: boolean;
+  document_id: string;
   filename: string;
   pages: number;
   chunks: number;
   message: string;
 }
 
+export interface BulkUploadFileResult {
+  filename: string;
+  success: boolean;
+  document_id: string | null;
+  pages: number;
+  chunks: number;
+  error: string | null;
+}
+
+export interface BulkUploadResult {
+  success: boolean;
+  files: number;
+  succeeded: number;
+  failed: number;
+  chunks: number;
+  results: BulkUploadFileResult[];
+}
+
 export interface WebSocketMessage {
   type: 'system' | 'voice_response' | 'typing' | 'error' | 'pong';
   message?: string;